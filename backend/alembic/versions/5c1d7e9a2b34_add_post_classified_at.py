@@ -0,0 +1,38 @@
+"""Add post classified_at
+
+Revision ID: 5c1d7e9a2b34
+Revises: 31ae138b73ba
+Create Date: 2026-10-18 10:12:41.518233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1d7e9a2b34'
+down_revision: Union[str, Sequence[str], None] = '31ae138b73ba'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('posts', sa.Column('classified_at', sa.DateTime(timezone=True), nullable=True))
+    # Существующие посты классифицированы при вставке
+    op.execute("UPDATE posts SET classified_at = created_at")
+    op.create_index(
+        'idx_post_pending_classification',
+        'posts',
+        ['id'],
+        unique=False,
+        postgresql_where=sa.text('classified_at IS NULL'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_post_pending_classification', table_name='posts')
+    op.drop_column('posts', 'classified_at')
@@ -0,0 +1,30 @@
+"""Add post model_version
+
+Revision ID: 9f2a4c6e8b10
+Revises: 5c1d7e9a2b34
+Create Date: 2026-10-18 11:04:09.271645
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f2a4c6e8b10'
+down_revision: Union[str, Sequence[str], None] = '5c1d7e9a2b34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('posts', sa.Column('model_version', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_posts_model_version'), 'posts', ['model_version'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_posts_model_version'), table_name='posts')
+    op.drop_column('posts', 'model_version')
@@ -0,0 +1,43 @@
+"""Add channel parse cursor
+
+Revision ID: a8d4f2c6e0b3
+Revises: f1c3a5e7b9d2
+Create Date: 2026-10-18 15:37:09.804116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d4f2c6e0b3'
+down_revision: Union[str, Sequence[str], None] = 'f1c3a5e7b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('channels', sa.Column('last_post_id', sa.BigInteger(), nullable=True))
+    op.add_column('channels', sa.Column('last_post_date', sa.DateTime(timezone=True), nullable=True))
+    # Курсор по уже сохранённым постам: самый новый пост каждого канала
+    op.execute(
+        """
+        UPDATE channels AS c
+        SET last_post_id = p.post_id, last_post_date = p.date
+        FROM (
+            SELECT DISTINCT ON (channel_id) channel_id, post_id, date
+            FROM posts
+            ORDER BY channel_id, post_id DESC
+        ) AS p
+        WHERE c.channel_id = p.channel_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('channels', 'last_post_date')
+    op.drop_column('channels', 'last_post_id')
@@ -0,0 +1,41 @@
+"""Add post simhash and canonical_post_id
+
+Revision ID: b3e8d1f4a7c2
+Revises: 9f2a4c6e8b10
+Create Date: 2026-10-18 12:21:37.804512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8d1f4a7c2'
+down_revision: Union[str, Sequence[str], None] = '9f2a4c6e8b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('posts', sa.Column('simhash', sa.BigInteger(), nullable=True))
+    op.add_column('posts', sa.Column('canonical_post_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'posts_canonical_post_id_fkey',
+        'posts',
+        'posts',
+        ['canonical_post_id'],
+        ['id'],
+        ondelete='SET NULL',
+    )
+    op.create_index(op.f('ix_posts_canonical_post_id'), 'posts', ['canonical_post_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_posts_canonical_post_id'), table_name='posts')
+    op.drop_constraint('posts_canonical_post_id_fkey', 'posts', type_='foreignkey')
+    op.drop_column('posts', 'canonical_post_id')
+    op.drop_column('posts', 'simhash')
@@ -0,0 +1,30 @@
+"""Add channel backfill checkpoint
+
+Revision ID: c5e9b1d3f7a4
+Revises: a8d4f2c6e0b3
+Create Date: 2026-10-18 16:24:51.097332
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e9b1d3f7a4'
+down_revision: Union[str, Sequence[str], None] = 'a8d4f2c6e0b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('channels', sa.Column('backfill_offset_id', sa.BigInteger(), nullable=True))
+    op.add_column('channels', sa.Column('backfill_completed_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('channels', 'backfill_completed_at')
+    op.drop_column('channels', 'backfill_offset_id')
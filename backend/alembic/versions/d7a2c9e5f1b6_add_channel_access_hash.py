@@ -0,0 +1,28 @@
+"""Add channel access_hash
+
+Revision ID: d7a2c9e5f1b6
+Revises: b3e8d1f4a7c2
+Create Date: 2026-10-18 13:02:54.116830
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a2c9e5f1b6'
+down_revision: Union[str, Sequence[str], None] = 'b3e8d1f4a7c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('channels', sa.Column('access_hash', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('channels', 'access_hash')
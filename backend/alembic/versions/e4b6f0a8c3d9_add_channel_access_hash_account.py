@@ -0,0 +1,28 @@
+"""Add channel access_hash_account
+
+Revision ID: e4b6f0a8c3d9
+Revises: d7a2c9e5f1b6
+Create Date: 2026-10-18 13:41:12.562207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b6f0a8c3d9'
+down_revision: Union[str, Sequence[str], None] = 'd7a2c9e5f1b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('channels', sa.Column('access_hash_account', sa.String(length=255), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('channels', 'access_hash_account')
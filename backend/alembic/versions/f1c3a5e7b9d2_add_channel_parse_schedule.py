@@ -0,0 +1,32 @@
+"""Add channel parse schedule
+
+Revision ID: f1c3a5e7b9d2
+Revises: e4b6f0a8c3d9
+Create Date: 2026-10-18 15:02:47.318540
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c3a5e7b9d2'
+down_revision: Union[str, Sequence[str], None] = 'e4b6f0a8c3d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('channels', sa.Column('next_parse_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('channels', sa.Column('parse_interval_seconds', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_channels_next_parse_at'), 'channels', ['next_parse_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_channels_next_parse_at'), table_name='channels')
+    op.drop_column('channels', 'parse_interval_seconds')
+    op.drop_column('channels', 'next_parse_at')
@@ -1,10 +1,18 @@
+import logging
 from datetime import timedelta
 
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
+from kombu import Queue
 
 import app.tasks.channel_cycle
+import app.tasks.classification
 import app.tasks.summarizator
 from app.core.config import settings
+from app.dependencies.telegram_client import telegram_client_pool
+from app.services.model_registry import model_registry
+
+logger = logging.getLogger(__name__)
 
 REDIS_URL = settings.REDIS_URL
 
@@ -20,14 +28,70 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    task_routes={
+        "classify_posts": {"queue": "classification"},
+        "reclassify_posts": {"queue": "classification"},
+        # Догрузка истории — отдельный воркер, чтобы не задерживать регулярный парсинг
+        "backfill_channel": {"queue": "backfill"},
+    },
+    # Воркер без -Q слушает все очереди, поэтому одного `celery worker` достаточно.
+    # В проде очереди разносятся по воркерам:
+    #   celery -A app.core.worker worker -Q celery
+    #   celery -A app.core.worker worker -Q classification
+    #   celery -A app.core.worker worker -Q backfill --concurrency=1
+    task_default_queue="celery",
+    task_queues=(Queue("celery"), Queue("classification"), Queue("backfill")),
 )
 
 
 celery_app.conf.beat_schedule = {
-    "parse-channels-every-30-mins": {
-        "task": "parse_channels_cycle",
-        "schedule": timedelta(minutes=30),
+    # Каналы парсятся по своему расписанию (Channel.next_parse_at), тик только выбирает, кому пора
+    "dispatch-due-channels": {
+        "task": "dispatch_due_channels",
+        "schedule": timedelta(seconds=settings.PARSE_SCHEDULER_TICK),
+    },
+    # Просмотры и комментарии недавних постов ещё растут после публикации
+    "refresh-engagement-every-hour": {
+        "task": "refresh_engagement",
+        "schedule": timedelta(hours=1),
+    },
+    # Подстраховка: подбирает посты, для которых не сработал запуск после вставки
+    "classify-pending-posts-every-minute": {
+        "task": "classify_posts",
+        "schedule": timedelta(minutes=1),
     },
 }
 
 celery_app.autodiscover_tasks(["app.tasks"])
+
+
+@worker_process_init.connect
+def warm_up_models(**kwargs):
+    """
+    Загружает ML-модели при старте процесса воркера, а не на первой задаче.
+    Воркерам, запущенным с -Q без очереди classification, модели не нужны:
+    для них загрузка отключается через ML_WARM_UP=false.
+    """
+    if settings.ML_WARM_UP:
+        try:
+            model_registry.warm_up()
+        except Exception:
+            # Модели загрузятся на первой задаче; перезагрузка должна работать и после сбоя
+            logger.exception("Не удалось загрузить ML-модели при старте")
+        model_registry.start_watching()
+
+
+@worker_process_init.connect
+def connect_telegram_client(**kwargs):
+    """Подключает Telegram-клиент один раз на процесс воркера (TG_CONNECT_ON_START)"""
+    if settings.TG_CONNECT_ON_START:
+        try:
+            telegram_client_pool.start()
+        except Exception:
+            # Клиент переподключится при первой задаче
+            logger.exception("Не удалось подключить Telegram-клиент при старте")
+
+
+@worker_process_shutdown.connect
+def disconnect_telegram_client(**kwargs):
+    telegram_client_pool.close()
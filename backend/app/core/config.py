@@ -19,6 +19,78 @@ class Settings(BaseSettings):
     # Session
     SESSION_NAME: str = "telegram_parser"
     TG_SESSION_STRING: str | None = None
+    # Несколько аккаунтов (JSON-список строк сессий); каналы делятся между ними
+    TG_SESSION_STRINGS: list[str] = []
+    # Аккаунт под FloodWait дольше этого (секунд) уступает каналы запасному
+    TG_FAILOVER_WAIT: float = 30.0
+    # Подключать Telegram-клиент при старте процесса воркера (не нужно воркерам classification)
+    TG_CONNECT_ON_START: bool = True
+    # Простой клиента (секунд), после которого соединение проверяется ping-ом
+    TG_HEALTH_CHECK_INTERVAL: float = 60.0
+
+    # Лимит запросов к Telegram API на аккаунт (адаптивный token bucket в Redis,
+    # общий для всех процессов воркеров)
+    TG_REQUESTS_PER_SECOND: float = 1.0
+    TG_REQUESTS_BURST: int = 5
+    TG_MIN_REQUESTS_PER_SECOND: float = 0.1
+    TG_MAX_REQUESTS_PER_SECOND: float = 3.0
+    # FloodWait дольше этого (секунд) прерывает парсинг канала
+    TG_MAX_FLOOD_WAIT: int = 600
+
+    # ML: путь к .pkl или к каталогу артефактов из app.ml.artifacts
+    TOPIC_MODEL_PATH: str = "/home/saryglar311/Projects/DIPLOM/backend/app/ml/LR/logistic_regression_model_topics.pkl"
+    PROBLEM_MODEL_PATH: str = "/home/saryglar311/Projects/DIPLOM/backend/app/ml/LR/logistic_regression_model_neg.pkl"
+    ML_WARM_UP: bool = True
+    ML_RELOAD_POLL_INTERVAL: float = 30.0
+    # Каталог хранилища TF-IDF признаков постов (None — не сохранять)
+    FEATURE_STORE_DIR: str | None = None
+    # Сегменты меньше SEGMENT_ROWS строк сливаются, когда их набирается MERGE_SEGMENTS;
+    # в памяти процесса держится не больше CACHE_SEGMENTS открытых сегментов
+    FEATURE_STORE_SEGMENT_ROWS: int = 100_000
+    FEATURE_STORE_MERGE_SEGMENTS: int = 16
+    FEATURE_STORE_CACHE_SEGMENTS: int = 64
+
+    # Кэш предсказаний
+    PREDICTION_CACHE_SIZE: int = 50_000
+    PREDICTION_CACHE_REDIS: bool = True
+    PREDICTION_CACHE_TTL: int = 7 * 24 * 3600
+
+    # Потоковый парсинг: очередь страниц между загрузкой и записью,
+    # потоки для очистки текста и размер пачки записи в БД
+    INGEST_QUEUE_SIZE: int = 4
+    INGEST_CLEAN_WORKERS: int = 2
+    INGEST_WRITE_CHUNK_SIZE: int = 500
+
+    # Почти-дубликаты постов (SimHash)
+    DEDUP_ENABLED: bool = True
+    DEDUP_MAX_DISTANCE: int = 3
+    DEDUP_WINDOW_DAYS: int = 14
+
+    # Обновление просмотров и комментариев постов за последние N дней
+    ENGAGEMENT_REFRESH_DAYS: int = 3
+
+    # Расписание парсинга по активности канала (интервалы в секундах)
+    PARSE_MIN_INTERVAL: int = 5 * 60
+    PARSE_MAX_INTERVAL: int = 6 * 3600
+    PARSE_DEFAULT_INTERVAL: int = 30 * 60
+    PARSE_RATE_WINDOW_DAYS: int = 7
+    PARSE_TARGET_NEW_POSTS: float = 3.0
+    PARSE_EMPTY_BACKOFF: float = 1.5
+    # Как часто beat проверяет, каким каналам пора, и на сколько канал
+    # откладывается при постановке задачи (если задача потеряется)
+    PARSE_SCHEDULER_TICK: int = 60
+    PARSE_DISPATCH_LEASE: int = 15 * 60
+    # Аренда блокировок в Redis: цикла целиком и отдельного канала (продлеваются heartbeat)
+    PARSE_CYCLE_LEASE: int = 10 * 60
+    PARSE_CHANNEL_LEASE: int = 2 * 60
+    # Дольше этого аренда цикла не продлевается, даже если chord так и не завершился
+    PARSE_CYCLE_MAX_DURATION: int = 6 * 3600
+
+    # Догрузка полной истории новых каналов (очередь backfill): время одного
+    # запуска задачи, пауза между страницами и задержка после FloodWait
+    BACKFILL_TIME_BUDGET: int = 10 * 60
+    BACKFILL_PAGE_INTERVAL: float = 2.0
+    BACKFILL_RETRY_DELAY: int = 15 * 60
 
     model_config = SettingsConfigDict(
         env_file="/home/saryglar311/Projects/DIPLOM/backend/.env"
@@ -5,7 +5,10 @@ from .config import settings
 
 DATABASE_URL = f"postgresql+psycopg2://{settings.DB_USER}:{settings.DB_PASS}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# values_plus_batch: массовые UPDATE (executemany) уходят пачками через execute_batch
+engine = create_engine(
+    DATABASE_URL, pool_pre_ping=True, executemany_mode="values_plus_batch"
+)
 
 session_maker = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
@@ -0,0 +1,19 @@
+import threading
+from typing import Optional
+
+import redis
+
+from .config import settings
+
+_client: Optional[redis.Redis] = None
+_lock = threading.Lock()
+
+
+def get_redis() -> redis.Redis:
+    """Общий для процесса клиент Redis (создаётся при первом обращении)"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
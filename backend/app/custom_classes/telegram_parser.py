@@ -1,25 +1,60 @@
-import asyncio
-from typing import Any, Dict, List, Optional
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
 from telethon import TelegramClient
 from telethon.errors import (
     ChannelInvalidError,
-    FloodWaitError,
     InviteHashInvalidError,
+    PeerIdInvalidError,
     UsernameNotOccupiedError,
 )
-from telethon.tl.types import Channel, Message
+from telethon.tl.functions.messages import GetMessagesViewsRequest
+from telethon.tl.types import Channel, InputPeerChannel, Message
 
+from app.core.config import settings
+from app.dependencies.rate_limiter import AdaptiveRateLimiter, get_rate_limiter
 from app.exceptions.custom_exceptions import (
     ChannelNotFoundException,
     InvalidLinkException,
     RateLimitException,
+    StaleEntityException,
 )
 
+PAGE_SIZE = 100  # максимум сообщений за один запрос messages.getHistory
+VIEWS_BATCH_SIZE = 100  # максимум id за один запрос messages.getMessagesViews
+
+
+@dataclass
+class FetchStats:
+    """Сколько сообщений пришло из Telegram и сколько из них оставлено"""
+
+    fetched: int = 0
+    kept: int = 0
+    skipped_old: int = 0    # id <= last_post_id (при min_id таких быть не должно)
+    skipped_empty: int = 0  # служебные сообщения и сообщения без текста
+    max_id: int = 0         # самый новый полученный id, включая пропущенные сообщения
+
+    def add(self, other: "FetchStats"):
+        self.fetched += other.fetched
+        self.kept += other.kept
+        self.skipped_old += other.skipped_old
+        self.skipped_empty += other.skipped_empty
+        self.max_id = max(self.max_id, other.max_id)
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
 
 class TelegramParser:
-    def __init__(self, client: TelegramClient):
+    def __init__(
+        self,
+        client: TelegramClient,
+        rate_limiter: Optional[AdaptiveRateLimiter] = None,
+        account: str = settings.SESSION_NAME,
+    ):
         self.client = client
+        self.account = account
+        self.rate_limiter = rate_limiter or get_rate_limiter(account)
 
     def _extract_channel_identifier(self, channel_link: str) -> str:
         if not channel_link:
@@ -45,7 +80,7 @@ class TelegramParser:
                     f"Числовой ID канала {ident} не поддерживается"
                 )
 
-            entity = await self.client.get_entity(ident)
+            entity = await self.rate_limiter.run(self.client.get_entity, ident)
             if not isinstance(entity, Channel):
                 raise ChannelNotFoundException("Сущность не является каналом")
 
@@ -53,51 +88,182 @@ class TelegramParser:
                 "id": entity.id,
                 "username": getattr(entity, "username", None),
                 "title": getattr(entity, "title", None),
+                "access_hash": getattr(entity, "access_hash", None),
                 "entity": entity,
             }
 
         except (ChannelInvalidError, UsernameNotOccupiedError, InviteHashInvalidError):
             raise ChannelNotFoundException(f"Канал {channel_link} не найден")
 
+    @staticmethod
+    def input_peer(channel_id: int, access_hash: int) -> InputPeerChannel:
+        """Ссылка на канал по сохранённым id и access_hash, без запроса к Telegram"""
+        return InputPeerChannel(channel_id=channel_id, access_hash=access_hash)
+
     async def parse_posts(
         self, 
-        entity: Channel, 
+        entity: Union[Channel, InputPeerChannel], 
         limit: int,
-        delay: float = 0.1, 
         last_post_id: Optional[int] = None,
+        stats: Optional[FetchStats] = None,
     ) -> List[Dict[str, Any]]:
+        """
+        Сообщения канала новее last_post_id: не больше limit ближайших к нему
+        (список от новых к старым). Для потоковой обработки — iter_pages.
+        """
         posts_data = []
-        try:            
-            async for message in self.client.iter_messages(
-                entity, 
-                limit=limit,
-                reverse=True
-            ):
+        async for page in self.iter_pages(entity, limit, last_post_id, stats):
+            posts_data.extend(page)
+        return sorted(posts_data, key=lambda post: post["post_id"], reverse=True)
+
+    async def _get_page(self, entity: Union[Channel, InputPeerChannel], **kwargs) -> List[Any]:
+        """Один запрос messages.getHistory через rate limiter аккаунта"""
+        try:
+            return await self.rate_limiter.run(self.client.get_messages, entity, **kwargs)
+        except RateLimitException:
+            raise
+        except (ChannelInvalidError, PeerIdInvalidError) as e:
+            if isinstance(entity, InputPeerChannel):
+                raise StaleEntityException(f"Канал {entity.channel_id}: {e}")
+            raise Exception(f"Ошибка парсинга Telegram: {e}")
+        except Exception as e:
+            raise Exception(f"Ошибка парсинга Telegram: {e}")
+
+    @staticmethod
+    def _to_post(message: Message) -> Dict[str, Any]:
+        return {
+            "post_id": message.id,
+            "message": message.text.strip(),
+            "date": message.date,
+            "views": getattr(message, "views", None),
+            "comments_count": getattr(
+                getattr(message, "replies", None), "replies", 0
+            ) or 0,
+        }
+
+    async def iter_pages(
+        self,
+        entity: Union[Channel, InputPeerChannel],
+        limit: int,
+        last_post_id: Optional[int] = None,
+        stats: Optional[FetchStats] = None,
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Отдаёт сообщения новее last_post_id страницами (от старых к новым), всего не больше limit.
+        Граница передаётся в Telegram через min_id, поэтому уже сохранённые
+        сообщения не скачиваются. Каждая страница до PAGE_SIZE сообщений —
+        один запрос через rate limiter аккаунта.
+        Для нового канала (last_post_id нет) отдаются самые свежие limit сообщений,
+        от новых к старым: более старую историю догружает iter_history (backfill).
+        Если передан stats, в него пишется, сколько сообщений получено и сколько оставлено.
+        """
+        if stats is None:
+            stats = FetchStats()
+        newest_first = last_post_id is None
+        cursor = last_post_id or 0
+        kept = 0
+        while kept < limit:
+            page_size = min(PAGE_SIZE, limit - kept)
+            if newest_first:
+                page = await self._get_page(entity, limit=page_size, offset_id=cursor)
+            else:
+                page = await self._get_page(entity, limit=page_size, min_id=cursor, reverse=True)
+            if not page:
+                break
+
+            posts_data = []
+            for message in page:
+                stats.fetched += 1
+                stats.max_id = max(stats.max_id, message.id)
                 if not isinstance(message, Message) or not message.text:
+                    stats.skipped_empty += 1
                     continue
-                
+
                 if last_post_id is not None and message.id <= last_post_id:
+                    stats.skipped_old += 1
+                    continue
+
+                stats.kept += 1
+                posts_data.append(self._to_post(message))
+
+            # Следующая страница: старше самого старого (новый канал) или новее самого нового
+            ids = [message.id for message in page]
+            cursor = min(ids) if newest_first else max(ids)
+
+            kept += len(posts_data)
+            if posts_data:
+                yield posts_data
+
+            if len(page) < page_size:
+                break
+
+    async def iter_history(
+        self,
+        entity: Union[Channel, InputPeerChannel],
+        offset_id: int = 0,
+        stats: Optional[FetchStats] = None,
+    ) -> AsyncIterator[Tuple[List[Dict[str, Any]], int]]:
+        """
+        Идёт по истории канала назад от offset_id (0 — с самого нового сообщения)
+        страницами по PAGE_SIZE. Отдаёт (посты страницы, id самого старого
+        сообщения страницы) — это offset_id для продолжения. Заканчивается,
+        когда история кончилась.
+        """
+        if stats is None:
+            stats = FetchStats()
+        while True:
+            page = await self._get_page(entity, limit=PAGE_SIZE, offset_id=offset_id)
+            if not page:
+                return
+
+            posts_data = []
+            for message in page:
+                stats.fetched += 1
+                stats.max_id = max(stats.max_id, message.id)
+                if not isinstance(message, Message) or not message.text:
+                    stats.skipped_empty += 1
                     continue
-                
-                posts_data.append(
-                    {
-                        "post_id": message.id,
-                        "message": message.text.strip(),
-                        "date": message.date,
-                        "views": getattr(message, "views", None),
-                        "comments_count": getattr(
-                            getattr(message, "replies", None), "replies", 0
-                        ) or 0,
-                    }
+                stats.kept += 1
+                posts_data.append(self._to_post(message))
+
+            offset_id = min(message.id for message in page)
+            yield posts_data, offset_id
+
+            if len(page) < PAGE_SIZE:
+                return
+
+    async def iter_engagement(
+        self,
+        entity: Union[Channel, InputPeerChannel],
+        post_ids: List[int],
+    ) -> AsyncIterator[List[Tuple[int, int, int]]]:
+        """
+        Текущие просмотры и число комментариев постов: (post_id, views, comments_count)
+        пачками до VIEWS_BATCH_SIZE id — один запрос messages.getMessagesViews
+        через rate limiter аккаунта вместо повторного скачивания сообщений.
+        Удалённые сообщения (без просмотров) пропускаются.
+        """
+        for start in range(0, len(post_ids), VIEWS_BATCH_SIZE):
+            chunk = post_ids[start:start + VIEWS_BATCH_SIZE]
+            try:
+                result = await self.rate_limiter.run(
+                    self.client,
+                    GetMessagesViewsRequest(peer=entity, id=chunk, increment=False),
                 )
-                
-                if len(posts_data) >= limit:
-                    break
-                    
-                await asyncio.sleep(delay)
-            
-            return posts_data[::-1]
-        except FloodWaitError as e:
-            raise RateLimitException(f"Flood wait: {e}")
-        except Exception as e:
-            raise Exception(f"Ошибка парсинга Telegram: {e}")
\ No newline at end of file
+            except RateLimitException:
+                raise
+            except (ChannelInvalidError, PeerIdInvalidError) as e:
+                if isinstance(entity, InputPeerChannel):
+                    raise StaleEntityException(f"Канал {entity.channel_id}: {e}")
+                raise Exception(f"Ошибка парсинга Telegram: {e}")
+            except Exception as e:
+                raise Exception(f"Ошибка парсинга Telegram: {e}")
+
+            # Ответ идёт в порядке запрошенных id
+            rows = [
+                (post_id, views.views, getattr(views.replies, "replies", 0) or 0)
+                for post_id, views in zip(chunk, result.views)
+                if views.views is not None
+            ]
+            if rows:
+                yield rows
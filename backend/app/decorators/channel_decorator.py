@@ -1,35 +1,45 @@
-import asyncio
 from functools import wraps
 
-from app.core.database import get_session
+from app.core.database import session_maker
 from app.custom_classes.telegram_parser import TelegramParser
-from app.dependencies.telegram_client import TelegramClientManager
+from app.dependencies.telegram_client import telegram_client_pool
 from app.repositories.channel import ChannelRepository
 from app.repositories.post import PostRepository
 from app.services.channel_service import ChannelService
 from app.services.parser_service import ParserService
 
-telegram_client = TelegramClientManager()
-
 
 def with_channel_service(func):
+    """
+    Выполняет асинхронную задачу в постоянном event loop пула Telegram-клиентов
+    и передаёт ей ChannelService со всеми подключёнными аккаунтами.
+    Сессия БД открывается на время задачи и закрывается после.
+    """
     @wraps(func)
     def wrapper(*args, **kwargs):
-        session = next(get_session())
-
-        channel_repo = ChannelRepository(session)
-        post_repo = PostRepository(session)
-
         async def async_runner():
-            async with telegram_client as client:
-                parser = TelegramParser(client)
-                parser_service = ParserService(parser, post_repo)
+            clients = await telegram_client_pool.get_clients()
+            with session_maker() as session:
+                channel_repo = ChannelRepository(session)
+                post_repo = PostRepository(session)
+
+                parser_services = {
+                    account: ParserService(TelegramParser(client, account=account), post_repo)
+                    for account, client in clients.items()
+                }
+                parser_service = parser_services.get(
+                    telegram_client_pool.default_account, next(iter(parser_services.values()))
+                )
                 channel_service = ChannelService(
-                    channel_repo, post_repo, parser_service
+                    channel_repo,
+                    post_repo,
+                    parser_service,
+                    parser_services=parser_services,
+                    account_ring=telegram_client_pool.ring,
                 )
                 kwargs["channel_service"] = channel_service
                 return await func(*args, **kwargs)
 
-        return asyncio.run(async_runner())
+        return telegram_client_pool.run(async_runner())
 
     return wrapper
@@ -0,0 +1,93 @@
+import logging
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+import redis
+
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Продлить/снять блокировку может только её владелец (сравнение токена атомарно в Redis)
+_EXTEND_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseLock:
+    """
+    Распределённая блокировка в Redis с арендой (lease).
+    - Ключ живёт ttl секунд: если владелец упал, блокировка освобождается сама.
+    - Пока работа идёт, фоновый поток продлевает аренду каждые ttl/3 секунд (heartbeat).
+    """
+
+    def __init__(
+        self,
+        key: str,
+        ttl: float,
+        token: Optional[str] = None,
+        redis_client: Optional[redis.Redis] = None,
+    ):
+        self.key = key
+        self.ttl = ttl
+        self.token = token or uuid.uuid4().hex
+        self._redis = redis_client or get_redis()
+
+    def acquire(self) -> bool:
+        return bool(self._redis.set(self.key, self.token, nx=True, px=int(self.ttl * 1000)))
+
+    def extend(self) -> bool:
+        return bool(
+            self._redis.eval(_EXTEND_SCRIPT, 1, self.key, self.token, int(self.ttl * 1000))
+        )
+
+    def release(self) -> bool:
+        return bool(self._redis.eval(_RELEASE_SCRIPT, 1, self.key, self.token))
+
+    def owner(self) -> Optional[str]:
+        value = self._redis.get(self.key)
+        return value.decode() if value is not None else None
+
+    @contextmanager
+    def hold(self, on_heartbeat: Optional[Callable[[], None]] = None) -> Iterator[bool]:
+        """
+        Захватывает блокировку и держит её, пока выполняется блок with.
+        Отдаёт False, если блокировка занята (блок выполняется, решает вызывающий).
+        on_heartbeat вызывается при каждом продлении.
+        """
+        if not self.acquire():
+            yield False
+            return
+
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(self.ttl / 3):
+                try:
+                    if not self.extend():
+                        logger.warning(f"Блокировка {self.key} потеряна (истекла аренда)")
+                        return
+                    if on_heartbeat is not None:
+                        on_heartbeat()
+                except redis.RedisError as e:
+                    logger.warning(f"Не удалось продлить блокировку {self.key}: {e}")
+
+        thread = threading.Thread(target=heartbeat, name=f"lease:{self.key}", daemon=True)
+        thread.start()
+        try:
+            yield True
+        finally:
+            stop.set()
+            thread.join()
+            self.release()
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import redis
+from telethon.errors import FloodWaitError
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.exceptions.custom_exceptions import RateLimitException
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RATE_LIMIT_KEY = "tg:ratelimit:{account}"
+# Состояние простаивающего аккаунта не нужно: без ключа bucket начинается полным
+RATE_LIMIT_STATE_TTL = 24 * 3600
+
+# Общая часть скриптов: время Redis (одно для всех воркеров) и пополнение bucket.
+# ARGV[1] — начальная скорость, ARGV[2] — burst, ARGV[3] — TTL состояния
+_REFILL = """
+local t = redis.call("TIME")
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call("HMGET", KEYS[1], "rate", "tokens", "updated")
+local rate = tonumber(state[1]) or tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local tokens = tonumber(state[2]) or burst
+-- Момент, до которого токены уже начислены (в будущем — пока идёт FloodWait)
+local updated = tonumber(state[3]) or now
+if now > updated then
+    tokens = math.min(burst, tokens + (now - updated) * rate)
+    updated = now
+end
+"""
+_SAVE = """
+redis.call("HSET", KEYS[1], "rate", tostring(rate), "tokens", tostring(tokens),
+    "updated", tostring(updated))
+redis.call("EXPIRE", KEYS[1], ARGV[3])
+"""
+_ACQUIRE_SCRIPT = _REFILL + """
+tokens = tokens - 1
+local wait = math.max(updated - now, 0) + math.max(-tokens, 0) / rate
+redis.call("HINCRBY", KEYS[1], "requests", 1)
+""" + _SAVE + "return tostring(wait)"
+# ARGV[4] — прирост скорости, ARGV[5] — максимальная скорость
+_SUCCESS_SCRIPT = _REFILL + """
+rate = math.min(tonumber(ARGV[5]), rate + tonumber(ARGV[4]))
+""" + _SAVE + "return tostring(rate)"
+# ARGV[4] — FloodWait в секундах, ARGV[5] — множитель скорости, ARGV[6] — минимальная скорость
+_FLOOD_WAIT_SCRIPT = _REFILL + """
+rate = math.max(tonumber(ARGV[6]), rate * tonumber(ARGV[5]))
+tokens = math.min(tokens, 0)
+updated = math.max(updated, now + tonumber(ARGV[4]))
+redis.call("HINCRBY", KEYS[1], "flood_waits", 1)
+""" + _SAVE + "return tostring(rate)"
+_THROTTLED_FOR_SCRIPT = _REFILL + "return tostring(math.max(updated - now, 0))"
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket для запросов к Telegram API одного аккаунта.
+
+    - Токен расходуется на каждый запрос к API (страница истории, get_entity),
+      а не на каждое сообщение.
+    - При FloodWait скорость уменьшается вдвое, а выдача токенов
+      приостанавливается на указанное Telegram время; после каждого
+      успешного запроса скорость плавно растёт обратно (AIMD).
+
+    Состояние bucket (скорость, токены, момент начисления) хранится в Redis
+    в tg:ratelimit:{account} и меняется Lua-скриптами атомарно, поэтому лимит
+    общий для всех процессов воркеров, которые работают от этого аккаунта.
+    Ожидание резервируется заранее (токены уходят в минус).
+    """
+
+    def __init__(
+        self,
+        account: str = settings.SESSION_NAME,
+        rate: float = settings.TG_REQUESTS_PER_SECOND,
+        burst: int = settings.TG_REQUESTS_BURST,
+        min_rate: float = settings.TG_MIN_REQUESTS_PER_SECOND,
+        max_rate: float = settings.TG_MAX_REQUESTS_PER_SECOND,
+        increase: float = 0.05,
+        decrease: float = 0.5,
+        max_flood_wait: int = settings.TG_MAX_FLOOD_WAIT,
+        redis_client: Optional[redis.Redis] = None,
+    ):
+        self.account = account
+        self.key = RATE_LIMIT_KEY.format(account=account)
+        self.initial_rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.max_flood_wait = max_flood_wait
+        self._redis_client = redis_client
+
+    @property
+    def redis(self) -> redis.Redis:
+        return self._redis_client or get_redis()
+
+    def _eval(self, script: str, *args) -> float:
+        return float(
+            self.redis.eval(
+                script, 1, self.key, self.initial_rate, self.burst, RATE_LIMIT_STATE_TTL, *args
+            )
+        )
+
+    async def acquire(self):
+        """Ждёт, пока можно выполнить следующий запрос"""
+        wait = self._eval(_ACQUIRE_SCRIPT)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def throttled_for(self) -> float:
+        """Сколько секунд ещё действует FloodWait (0 — аккаунт не ограничен)"""
+        return self._eval(_THROTTLED_FOR_SCRIPT)
+
+    def on_success(self):
+        self._eval(_SUCCESS_SCRIPT, self.increase, self.max_rate)
+
+    def on_flood_wait(self, seconds: float) -> float:
+        """Снижает скорость и останавливает выдачу токенов на seconds секунд; возвращает скорость"""
+        return self._eval(_FLOOD_WAIT_SCRIPT, seconds, self.decrease, self.min_rate)
+
+    async def run(self, request: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        """
+        Выполняет запрос к API с учётом лимита.
+        При FloodWait ждёт и повторяет запрос; если Telegram просит ждать
+        дольше max_flood_wait секунд, бросает RateLimitException.
+        """
+        while True:
+            await self.acquire()
+            try:
+                result = await request(*args, **kwargs)
+            except FloodWaitError as e:
+                rate = self.on_flood_wait(e.seconds)
+                if e.seconds > self.max_flood_wait:
+                    raise RateLimitException(f"Flood wait: {e}")
+                logger.warning(
+                    f"FloodWait {e.seconds} с, скорость аккаунта {self.account} "
+                    f"снижена до {rate:.2f} запр/с"
+                )
+                continue
+
+            self.on_success()
+            return result
+
+    def stats(self) -> Dict[str, float]:
+        raw = self.redis.hgetall(self.key)
+        state = {key.decode(): float(value) for key, value in raw.items()}
+        return {
+            "rate": state.get("rate", self.initial_rate),
+            "tokens": state.get("tokens", float(self.burst)),
+            "requests": int(state.get("requests", 0)),
+            "flood_waits": int(state.get("flood_waits", 0)),
+        }
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(account: str = settings.SESSION_NAME) -> AdaptiveRateLimiter:
+    """Лимитер аккаунта Telegram (состояние общее для всех процессов через Redis)"""
+    with _limiters_lock:
+        limiter = _limiters.get(account)
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(account)
+            _limiters[account] = limiter
+        return limiter
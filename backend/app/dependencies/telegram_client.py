@@ -1,47 +1,225 @@
-from typing import Optional
+import asyncio
+import bisect
+import hashlib
+import logging
+import random
+import threading
+import time
+from typing import Any, Coroutine, Dict, Iterable, List, Optional, TypeVar, Union
 
 from telethon import TelegramClient
 from telethon.sessions import StringSession
+from telethon.tl.functions import PingRequest
 
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
 
-class TelegramClientManager:
+T = TypeVar("T")
+
+
+def create_client(session_string: Optional[str] = settings.TG_SESSION_STRING) -> TelegramClient:
+    return TelegramClient(
+        StringSession(session_string) if session_string else None,
+        settings.API_ID,
+        settings.API_HASH,
+        device_model="Telegram Parser Server",
+        system_version="4.16.30-vxCUSTOM",
+        app_version="1.0.0",
+        timeout=10,
+    )
+
+
+async def connect_client(client: TelegramClient) -> TelegramClient:
+    await client.connect()
+
+    if not await client.is_user_authorized():
+        raise RuntimeError(
+            "Telegram client not authorized. Проверьте TG_SESSION_STRING."
+        )
+
+    return client
+
+
+def account_sessions() -> Dict[str, Optional[str]]:
+    """
+    Аккаунты парсера: имя -> строка сессии.
+    Один аккаунт (TG_SESSION_STRING) называется SESSION_NAME,
+    несколько (TG_SESSION_STRINGS) — SESSION_NAME-0, SESSION_NAME-1, ...
+    """
+    strings = settings.TG_SESSION_STRINGS or [settings.TG_SESSION_STRING]
+    if len(strings) == 1:
+        return {settings.SESSION_NAME: strings[0]}
+    return {f"{settings.SESSION_NAME}-{i}": string for i, string in enumerate(strings)}
+
+
+def _ring_hash(key: str) -> int:
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class AccountRing:
+    """
+    Консистентное хэширование каналов по аккаунтам: при добавлении или
+    удалении аккаунта переезжает только его доля каналов.
+    """
+
+    def __init__(self, accounts: Iterable[str], replicas: int = 100):
+        self.accounts = list(dict.fromkeys(accounts))
+        points = sorted(
+            (_ring_hash(f"{account}#{replica}"), account)
+            for account in self.accounts
+            for replica in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [account for _, account in points]
+
+    def accounts_for(self, channel_id: Union[int, str]) -> List[str]:
+        """
+        Аккаунты для канала: основной, затем запасные в порядке обхода кольца.
+        До резолва канала ключом служит username.
+        """
+        if not self._owners:
+            return []
+        start = bisect.bisect(self._hashes, _ring_hash(str(channel_id)))
+        result: List[str] = []
+        for step in range(len(self._owners)):
+            account = self._owners[(start + step) % len(self._owners)]
+            if account not in result:
+                result.append(account)
+                if len(result) == len(self.accounts):
+                    break
+        return result
+
+
+class TelegramClientPool:
     """
-    Асинхронный контекстный менеджер для TelegramClient.
-    - Создает клиента при входе в контекст.
-    - Отключает клиента при выходе.
-    - Подходит для однократного использования в рамках одной операции.
+    Долгоживущие TelegramClient процесса воркера, по одному на аккаунт.
+    - Свой event loop в фоновом потоке, общий для всех задач процесса:
+      клиенты подключаются один раз, задачи не тратят время на MTProto-рукопожатие.
+    - Перед выдачей клиента проверяет соединение (ping, если клиент простаивал
+      дольше health_check_interval) и переподключается при сбое.
+    - Каналы распределяются по аккаунтам консистентным хэшированием (ring).
     """
 
-    def __init__(self):
-        self.client: Optional[TelegramClient] = None
-
-    async def __aenter__(self) -> TelegramClient:
-        self.client = TelegramClient(
-            (
-                StringSession(settings.TG_SESSION_STRING)
-                if settings.TG_SESSION_STRING
-                else None
-            ),
-            settings.API_ID,
-            settings.API_HASH,
-            device_model="Telegram Parser Server",
-            system_version="4.16.30-vxCUSTOM",
-            app_version="1.0.0",
-            timeout=10,
+    def __init__(
+        self,
+        accounts: Optional[Dict[str, Optional[str]]] = None,
+        health_check_interval: float = settings.TG_HEALTH_CHECK_INTERVAL,
+    ):
+        self.accounts = accounts if accounts is not None else account_sessions()
+        self.default_account = next(iter(self.accounts))
+        self.ring = AccountRing(self.accounts)
+        self.health_check_interval = health_check_interval
+
+        self._clients: Dict[str, TelegramClient] = {}
+        self._last_used: Dict[str, float] = {}
+        self._connect_locks: Dict[str, asyncio.Lock] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Постоянный event loop пула (запускается при первом обращении)"""
+        with self._thread_lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._connect_locks = {}
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="telegram-client-loop", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """Выполняет корутину в event loop пула и ждёт результат (для синхронных задач Celery)"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop()).result(timeout)
+
+    def start(self):
+        """Подключает клиентов всех аккаунтов заранее, при старте процесса воркера"""
+        clients = self.run(self.get_clients())
+        logger.info(f"Подключено Telegram-аккаунтов: {len(clients)} из {len(self.accounts)}")
+
+    async def get_clients(self) -> Dict[str, TelegramClient]:
+        """Подключённые клиенты всех аккаунтов; аккаунты, которые не подключились, пропускаются"""
+        names = list(self.accounts)
+        connected = await asyncio.gather(
+            *(self.get_client(name) for name in names), return_exceptions=True
         )
 
-        await self.client.connect()
+        clients = {}
+        for name, client in zip(names, connected):
+            if isinstance(client, Exception):
+                logger.error(f"Telegram-аккаунт {name} недоступен: {client}")
+            else:
+                clients[name] = client
+        if not clients:
+            raise RuntimeError("Ни один Telegram-аккаунт не подключился")
+        return clients
+
+    async def get_client(self, account: Optional[str] = None) -> TelegramClient:
+        """Подключённый клиент аккаунта; вызывается внутри event loop пула"""
+        account = account or self.default_account
+        lock = self._connect_locks.setdefault(account, asyncio.Lock())
+
+        async with lock:
+            client = self._clients.get(account)
+            if client is not None and not await self._is_healthy(account, client):
+                logger.warning(f"Соединение аккаунта {account} потеряно, переподключаемся")
+                await self._disconnect(account)
+                client = None
+
+            if client is None:
+                client = create_client(self.accounts[account])
+                self._clients[account] = client
+                try:
+                    await connect_client(client)
+                except Exception:
+                    await self._disconnect(account)
+                    raise
 
-        if not await self.client.is_user_authorized():
-            raise RuntimeError(
-                "Telegram client not authorized. Проверьте TG_SESSION_STRING."
+            self._last_used[account] = time.monotonic()
+            return client
+
+    async def _is_healthy(self, account: str, client: TelegramClient) -> bool:
+        if not client.is_connected():
+            return False
+        if time.monotonic() - self._last_used.get(account, 0.0) < self.health_check_interval:
+            return True
+        try:
+            await asyncio.wait_for(
+                client(PingRequest(ping_id=random.getrandbits(63))), timeout=10
             )
+            return True
+        except Exception as e:
+            logger.warning(f"Проверка соединения аккаунта {account} не прошла: {e}")
+            return False
+
+    async def _disconnect(self, account: str):
+        client = self._clients.pop(account, None)
+        if client is not None and client.is_connected():
+            try:
+                await client.disconnect()
+            except Exception as e:
+                logger.warning(f"Ошибка при отключении аккаунта {account}: {e}")
+
+    async def _disconnect_all(self):
+        for account in list(self._clients):
+            await self._disconnect(account)
+
+    def close(self):
+        """Отключает клиентов и останавливает event loop (при завершении процесса)"""
+        with self._thread_lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._disconnect_all(), loop).result(10)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join(timeout=10)
+            loop.close()
 
-        return self.client
 
-    async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.client and self.client.is_connected():
-            await self.client.disconnect()
-        self.client = None
+telegram_client_pool = TelegramClientPool()
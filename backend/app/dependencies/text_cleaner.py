@@ -1,8 +1,36 @@
 import re
+from typing import Iterable, List
 
-def clean_telegram_post(text: str) -> str:
+# Рекламные фразы (точно под каналы из knowledge base)
+AD_PATTERNS = [
+    # Из описания канала +Vf8kMe9-6txmZTAy:
+    r'прислать фото.*',
+    r'прислать видео.*',
+    r'любую информацию.*',
+    r'пригласить друга.*',
+    r'по рекламе.*',
+    r'№\s*\d{10}',  # номер 6010050555
+    r'#\w{5,}',     # хештеги вроде #2WMY0
+
+    # Из описания @mtyva_bot:
+    r'присылайте мне.*',
+    r'всё, что происходит.*',
+    r'если новость эксклюзивная.*',
+    r'заплачу.*',
+    r'красивые фото приветствуются.*',
+    r'manager тыва',
+    r'launch.*right away',
+
+    # Общие служебные фразы:
+    r'(?:по вопросам|контакты?|сотрудничество|реклама)\s*[:\-—]?\s*\S.*',
+    r'номер для рекламы.*',
+    r'бот\s*@?\w+',
+]
+
+
+class TelegramPostCleaner:
     """
-    Очищает Telegram-пост от:
+    Очищает Telegram-посты от:
     - ссылок (Markdown, URL, t.me, приглашения)
     - упоминаний (@...)
     - эмодзи
@@ -10,71 +38,86 @@ def clean_telegram_post(text: str) -> str:
     - служебных фраз («Присылайте», «По рекламе», «Заплачу» и т.д.)
     - мусорных ID и хештегов (#2WMY0)
 
+    Все регулярные выражения компилируются один раз при создании объекта.
+    """
+
+    def __init__(self, ad_patterns: Iterable[str] = AD_PATTERNS):
+        ad_patterns = list(ad_patterns)
+
+        # 1. Markdown-ссылки полностью: [текст](ссылка)
+        self._markdown_link = re.compile(r'\s*\[[^]]*\]\([^)]*\)\s*')
+        # 2. URL и t.me-ссылки (включая приглашения вида t.me/+...)
+        self._url = re.compile(r'https?://\S+|t\.me/[^\s\)\]\n]+', re.IGNORECASE)
+        # 3. Упоминания (@username)
+        self._mention = re.compile(r'@[a-zA-Z0-9_]+')
+        # 4. Эмодзи
+        self._emoji = re.compile(
+            "["
+            "\U0001F600-\U0001F64F"  # эмоции
+            "\U0001F300-\U0001F5FF"  # символы/пиктограммы
+            "\U0001F680-\U0001F6FF"  # транспорт
+            "\U0001F1E0-\U0001F1FF"  # флаги
+            "\U00002702-\U000027B0"
+            "\U000024C2-\U0001F251"
+            "]+",
+            flags=re.UNICODE,
+        )
+        # 5. Рекламные фразы. Общая альтернатива проверяет пост за один проход;
+        # построчные замены выполняются только для постов, где она сработала.
+        # Сами замены остаются последовательными: шаблоны с \s могут захватывать
+        # соседние строки, и слитая замена дала бы другой результат.
+        self._ad_gate = re.compile(
+            "|".join(f"(?:{pattern})" for pattern in ad_patterns),
+            re.IGNORECASE | re.MULTILINE,
+        )
+        self._ad_patterns = [
+            re.compile(rf'\s*{pattern}.*?$', re.IGNORECASE | re.MULTILINE)
+            for pattern in ad_patterns
+        ]
+        # 6. Всё, кроме букв, пробелов, дефисов, кавычек и пунктуации
+        self._garbage = re.compile(r'[^\w\s\-\«\»\"\'\.\,\:\;\!\?\(\)\—]')
+        # 7. Whitespace
+        self._blank_lines = re.compile(r'\n\s*\n')
+        self._spaces = re.compile(r'[ \t]+')
+        self._line_edges = re.compile(r'^\s+|\s+$', re.MULTILINE)
+        self._many_newlines = re.compile(r'\n{3,}')
+
+    def clean(self, text: str) -> str:
+        """Возвращает чистый текст, пригодный для препроцессинга и классификации."""
+        if not text:
+            return ""
+
+        text = self._markdown_link.sub('\n', text)
+        text = self._url.sub('', text)
+        text = self._mention.sub('', text)
+        text = self._emoji.sub('', text)
+
+        if self._ad_gate.search(text):
+            for pattern in self._ad_patterns:
+                text = pattern.sub('', text)
+
+        text = self._garbage.sub(' ', text)
+
+        text = self._blank_lines.sub('\n\n', text)      # 2+ пустых строки → 2
+        text = self._spaces.sub(' ', text)              # множественные пробелы → 1
+        text = self._line_edges.sub('', text)
+        text = self._many_newlines.sub('\n\n', text)
+
+        return text.strip()
+
+    def clean_many(self, texts: Iterable[str]) -> List[str]:
+        """Очищает пачку постов"""
+        clean = self.clean
+        return [clean(text) for text in texts]
+
+
+telegram_post_cleaner = TelegramPostCleaner()
+
+
+def clean_telegram_post(text: str) -> str:
+    """
+    Очищает Telegram-пост (см. TelegramPostCleaner).
+
     Возвращает чистый текст, пригодный для препроцессинга и классификации.
     """
-    if not text:
-        return ""
-
-    # 1. Удалить Markdown-ссылки полностью: [текст](ссылка)
-    text = re.sub(r'\s*\[[^]]*\]\([^)]*\)\s*', '\n', text)
-
-    # 2. Удалить все URL и t.me-ссылки (включая приглашения вида t.me/+...)
-    text = re.sub(r'https?://\S+|t\.me/[^\s\)\]\n]+', '', text, flags=re.IGNORECASE)
-
-    # 3. Удалить упоминания (@username)
-    text = re.sub(r'@[a-zA-Z0-9_]+', '', text)
-
-    # 4. Удалить эмодзи
-    emoji_pattern = re.compile(
-        "["
-        "\U0001F600-\U0001F64F"  # эмоции
-        "\U0001F300-\U0001F5FF"  # символы/пиктограммы
-        "\U0001F680-\U0001F6FF"  # транспорт
-        "\U0001F1E0-\U0001F1FF"  # флаги
-        "\U00002702-\U000027B0"
-        "\U000024C2-\U0001F251"
-        "]+",
-        flags=re.UNICODE,
-    )
-    text = emoji_pattern.sub(r'', text)
-
-    # 5. Удалить рекламные фразы (точно под каналы из knowledge base)
-    ad_patterns = [
-        # Из описания канала +Vf8kMe9-6txmZTAy:
-        r'прислать фото.*',
-        r'прислать видео.*',
-        r'любую информацию.*',
-        r'пригласить друга.*',
-        r'по рекламе.*',
-        r'№\s*\d{10}',  # номер 6010050555
-        r'#\w{5,}',     # хештеги вроде #2WMY0
-
-        # Из описания @mtyva_bot:
-        r'присылайте мне.*',
-        r'всё, что происходит.*',
-        r'если новость эксклюзивная.*',
-        r'заплачу.*',
-        r'красивые фото приветствуются.*',
-        r'manager тыва',
-        r'launch.*right away',
-
-        # Общие служебные фразы:
-        r'(?:по вопросам|контакты?|сотрудничество|реклама)\s*[:\-—]?\s*\S.*',
-        r'номер для рекламы.*',
-        r'бот\s*@?\w+',
-    ]
-
-    for pattern in ad_patterns:
-        text = re.sub(rf'(?im)\s*{pattern}.*?$', '', text)
-
-    # 6. Удалить остаточные "мусорные" символы, оставить только:
-    # буквы, пробелы, дефисы, кавычки («», "", ''), пунктуацию (. , : ; ! ? ( ) —)
-    text = re.sub(r'[^\w\s\-\«\»\"\'\.\,\:\;\!\?\(\)\—]', ' ', text)
-
-    # 7. Почистить whitespace
-    text = re.sub(r'\n\s*\n', '\n\n', text)        # 2+ пустых строки → 2
-    text = re.sub(r'[ \t]+', ' ', text)            # множественные пробелы → 1
-    text = re.sub(r'^\s+|\s+$', '', text, flags=re.MULTILINE)
-    text = re.sub(r'\n{3,}', '\n\n', text)
-
-    return text.strip()
\ No newline at end of file
+    return telegram_post_cleaner.clean(text)
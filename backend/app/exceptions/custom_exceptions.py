@@ -26,3 +26,9 @@ class RateLimitException(TelegramParserException):
     """Превышен лимит запросов"""
 
     pass
+
+
+class StaleEntityException(TelegramParserException):
+    """Сохранённый access_hash канала больше не действителен"""
+
+    pass
@@ -1,11 +1,23 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.routes.parser import router as parser_router
 from app.routes.analytics import router as analytics_router
 from app.routes.summarization import router as summarization_router
+from app.services.model_registry import model_registry
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # API тоже классифицирует (/analytics/posts/explain): следим за новыми моделями
+    model_registry.start_watching()
+    yield
+    model_registry.stop_watching()
+
 
-app = FastAPI(title="Telegram Parser API")
+app = FastAPI(title="Telegram Parser API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,313 @@
+"""
+Компактный формат ML-артефактов для воркеров Celery.
+
+Пайплайны из .pkl раскладываются по отдельным .npy-файлам (коэффициенты,
+свободные члены, idf, отсортированный словарь и индексы признаков),
+которые открываются через np.load(mmap_mode="r"). Все prefork-процессы
+читают одни и те же физические страницы вместо собственных копий
+словаря и матриц коэффициентов.
+
+Экспорт:
+    python -m app.ml.artifacts topics <model.pkl> <out_dir>
+    python -m app.ml.artifacts problem <model.pkl> <out_dir>
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from scipy import sparse
+
+MANIFEST_FILE = "manifest.json"
+COEF_FILE = "coef.npy"
+INTERCEPT_FILE = "intercept.npy"
+IDF_FILE = "idf.npy"
+TERMS_FILE = "terms.npy"
+TERM_INDEX_FILE = "term_index.npy"
+
+# Параметры векторизатора, которые нужны только при обучении
+_FIT_ONLY_PARAMS = {"vocabulary", "dtype", "max_df", "min_df", "max_features", "input"}
+_CALLABLE_PARAMS = ("preprocessor", "tokenizer", "analyzer")
+
+
+def is_artifacts_dir(path: str) -> bool:
+    """Проверяет, что путь указывает на экспортированные артефакты, а не на .pkl"""
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def file_version(path: str) -> str:
+    """Версия модели: префикс sha256 исходного файла"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def content_version(data: bytes) -> str:
+    """Версия модели по уже прочитанному содержимому .pkl (совпадает с file_version)"""
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+class MappedTfidfVectorizer:
+    """
+    TF-IDF векторизатор поверх memory-mapped словаря.
+    Повторяет transform() sklearn-овского TfidfVectorizer без dict-словаря в памяти процесса.
+    """
+
+    def __init__(self, directory: str, params: Dict[str, Any]):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        self.params = dict(params)
+        analyzer_params = {
+            k: v
+            for k, v in self.params.items()
+            if k not in ("norm", "use_idf", "smooth_idf", "sublinear_tf")
+        }
+        if analyzer_params.get("ngram_range") is not None:
+            analyzer_params["ngram_range"] = tuple(analyzer_params["ngram_range"])
+        self._analyzer = TfidfVectorizer(**analyzer_params).build_analyzer()
+
+        self.terms = np.load(os.path.join(directory, TERMS_FILE), mmap_mode="r")
+        self.term_index = np.load(os.path.join(directory, TERM_INDEX_FILE), mmap_mode="r")
+        idf_path = os.path.join(directory, IDF_FILE)
+        self.idf = np.load(idf_path, mmap_mode="r") if os.path.exists(idf_path) else None
+        self.n_features = len(self.terms)
+        self._feature_names = None
+
+    def transform(self, texts: List[str]) -> sparse.csr_matrix:
+        """Векторизует пачку текстов одним поиском по отсортированному словарю"""
+        from sklearn.preprocessing import normalize
+
+        docs = [self._analyzer(text) for text in texts]
+        lengths = np.fromiter((len(d) for d in docs), dtype=np.int64, count=len(docs))
+        shape = (len(texts), self.n_features)
+
+        tokens = [token for doc in docs for token in doc]
+        if not tokens or not self.n_features:
+            return sparse.csr_matrix(shape, dtype=np.float64)
+
+        tokens = np.array(tokens)
+        rows = np.repeat(np.arange(len(texts)), lengths)
+        positions = np.minimum(np.searchsorted(self.terms, tokens), self.n_features - 1)
+        found = self.terms[positions] == tokens
+
+        matrix = sparse.csr_matrix(
+            (
+                np.ones(int(found.sum()), dtype=np.float64),
+                (rows[found], self.term_index[positions[found]]),
+            ),
+            shape=shape,
+        )
+        matrix.sum_duplicates()
+
+        if self.params.get("binary"):
+            matrix.data[:] = 1.0
+        if self.params.get("sublinear_tf"):
+            np.log(matrix.data, out=matrix.data)
+            matrix.data += 1.0
+        if self.params.get("use_idf", True) and self.idf is not None:
+            matrix.data *= self.idf[matrix.indices]
+        if self.params.get("norm"):
+            matrix = normalize(matrix, norm=self.params["norm"], copy=False)
+
+        return matrix
+
+    def get_feature_names_out(self) -> np.ndarray:
+        """Имена признаков в порядке столбцов матрицы (строится один раз)"""
+        if self._feature_names is None:
+            names = np.empty(self.n_features, dtype=object)
+            names[np.asarray(self.term_index)] = self.terms
+            self._feature_names = names
+        return self._feature_names
+
+
+class MappedLinearModel:
+    """Линейная модель (коэффициенты, свободные члены, векторизатор) из каталога артефактов"""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+
+        self.directory = directory
+        self.version: str = self.manifest["version"]
+        self.vectorizer = MappedTfidfVectorizer(directory, self.manifest["vectorizer"])
+        # (n_features, n_outputs), чтобы X @ coef не требовал копирования
+        self.coef = np.load(os.path.join(directory, COEF_FILE), mmap_mode="r")
+        self.intercept = np.load(os.path.join(directory, INTERCEPT_FILE), mmap_mode="r")
+
+
+def _vectorizer_params(vectorizer) -> Dict[str, Any]:
+    params = {}
+    for key, value in vectorizer.get_params().items():
+        if key in _FIT_ONLY_PARAMS:
+            continue
+        if key in _CALLABLE_PARAMS and callable(value):
+            raise ValueError(f"Векторизатор с пользовательским {key} не поддерживается")
+        if isinstance(value, (set, frozenset)):
+            value = sorted(value)
+        elif isinstance(value, tuple):
+            value = list(value)
+        params[key] = value
+    return params
+
+
+def _check_logistic(estimator):
+    from sklearn.linear_model import LogisticRegression
+
+    if not isinstance(estimator, LogisticRegression) or len(estimator.classes_) != 2:
+        raise ValueError("Экспорт поддерживает только бинарную LogisticRegression")
+    if getattr(estimator, "multi_class", "auto") == "multinomial":
+        raise ValueError("Экспорт не поддерживает multi_class='multinomial'")
+
+
+def _write_artifacts(
+    out_dir: str,
+    vectorizer,
+    coef: np.ndarray,
+    intercept: np.ndarray,
+    manifest: Dict[str, Any],
+):
+    os.makedirs(out_dir, exist_ok=True)
+
+    vocabulary = vectorizer.vocabulary_
+    keys = np.array(list(vocabulary.keys()))
+    order = np.argsort(keys, kind="stable")
+    terms = keys[order]
+    term_index = np.array(list(vocabulary.values()), dtype=np.int64)[order]
+
+    np.save(os.path.join(out_dir, TERMS_FILE), terms)
+    np.save(os.path.join(out_dir, TERM_INDEX_FILE), term_index)
+    if getattr(vectorizer, "use_idf", False):
+        np.save(os.path.join(out_dir, IDF_FILE), np.asarray(vectorizer.idf_, dtype=np.float64))
+    np.save(os.path.join(out_dir, COEF_FILE), np.ascontiguousarray(coef, dtype=np.float64))
+    np.save(os.path.join(out_dir, INTERCEPT_FILE), np.asarray(intercept, dtype=np.float64))
+
+    manifest = {**manifest, "vectorizer": _vectorizer_params(vectorizer)}
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def export_topic_model(pickle_path: str, out_dir: str) -> str:
+    """Экспортирует модель тем (словарь с model/vectorizer/topics) в каталог артефактов"""
+    with open(pickle_path, "rb") as f:
+        saved_data = pickle.load(f)
+
+    estimators = saved_data["model"].estimators_
+    for estimator in estimators:
+        _check_logistic(estimator)
+
+    coef = np.vstack([e.coef_[0] for e in estimators]).T
+    intercept = np.array([e.intercept_[0] for e in estimators])
+
+    _write_artifacts(
+        out_dir,
+        saved_data["vectorizer"],
+        coef,
+        intercept,
+        {
+            "kind": "topics",
+            "version": file_version(pickle_path),
+            "topics": list(saved_data["topics"]),
+            "stopwords": (
+                sorted(saved_data["stopwords"]) if "stopwords" in saved_data else None
+            ),
+        },
+    )
+    return out_dir
+
+
+def export_problem_model(pickle_path: str, out_dir: str) -> str:
+    """Экспортирует пайплайн tfidf + clf бинарной модели в каталог артефактов"""
+    import joblib
+
+    model = joblib.load(pickle_path)
+    classifier = model.named_steps["clf"]
+    _check_logistic(classifier)
+
+    _write_artifacts(
+        out_dir,
+        model.named_steps["tfidf"],
+        classifier.coef_.T,
+        classifier.intercept_,
+        {
+            "kind": "problem",
+            "version": file_version(pickle_path),
+            "classes": classifier.classes_.tolist(),
+        },
+    )
+    return out_dir
+
+
+def _sample_texts(vectorizer, n_texts: int = 200, seed: int = 0) -> List[str]:
+    """Синтетические тексты из слов словаря для проверки совпадения предсказаний"""
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(list(vectorizer.vocabulary_.keys()))
+    texts = ["", "   "]
+    for _ in range(n_texts):
+        words = rng.choice(vocabulary, size=int(rng.integers(1, 60)))
+        texts.append(" ".join(words))
+    return texts
+
+
+def verify_parity(
+    kind: str,
+    pickle_path: str,
+    out_dir: str,
+    texts: Optional[List[str]] = None,
+    atol: float = 1e-9,
+) -> float:
+    """
+    Сравнивает предсказания сервиса на .pkl и на артефактах.
+    Возвращает максимальное расхождение вероятностей, при превышении atol бросает ValueError.
+    """
+    if kind == "topics":
+        from app.services.classification_service import ClassificationService
+
+        reference = ClassificationService(pickle_path).warm_up()
+        mapped = ClassificationService(out_dir).warm_up()
+        texts = texts or _sample_texts(reference.vectorizer)
+        processed = [reference.preprocess_text_simple(t) for t in texts]
+        expected = reference._predict_proba_matrix(processed)
+        actual = mapped._predict_proba_matrix(processed)
+        same_labels = reference.predict_topics_batch(texts) == mapped.predict_topics_batch(texts)
+    else:
+        from app.services.binary_classif_service import BinaryClassificationService
+
+        reference = BinaryClassificationService(pickle_path).warm_up()
+        mapped = BinaryClassificationService(out_dir).warm_up()
+        texts = texts or _sample_texts(reference.vectorizer)
+        expected_batch = reference.predict_batch(texts)
+        actual_batch = mapped.predict_batch(texts)
+        expected, actual = expected_batch.probability, actual_batch.probability
+        same_labels = np.array_equal(expected_batch.is_problem, actual_batch.is_problem)
+
+    max_diff = float(np.max(np.abs(expected - actual))) if len(texts) else 0.0
+    if max_diff > atol or not same_labels:
+        raise ValueError(
+            f"Артефакты {out_dir} расходятся с {pickle_path}: max|Δp|={max_diff:.3e}"
+        )
+    return max_diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт моделей в memory-mapped формат")
+    parser.add_argument("kind", choices=["topics", "problem"])
+    parser.add_argument("pickle_path")
+    parser.add_argument("out_dir")
+    args = parser.parse_args()
+
+    if args.kind == "topics":
+        export_topic_model(args.pickle_path, args.out_dir)
+    else:
+        export_problem_model(args.pickle_path, args.out_dir)
+
+    max_diff = verify_parity(args.kind, args.pickle_path, args.out_dir)
+    print(f"Артефакты записаны в {args.out_dir}, max|Δp|={max_diff:.3e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Хранилище разреженных TF-IDF признаков постов.
+
+Признаки каждой модели лежат в <root>/<namespace>/<model_version>/ сегментами
+CSR-матриц: каждый сегмент — каталог с ids.npy, data.npy, indices.npy и indptr.npy,
+которые читаются через np.load(mmap_mode="r"). Список сегментов с диапазонами id
+хранится в index.json и обновляется под файловой блокировкой, поэтому дописывать
+сегменты могут несколько воркеров одновременно.
+
+Каждая пачка классификации пишет маленький сегмент. Когда в хвосте индекса
+набирается merge_segments сегментов меньше segment_rows строк, они сливаются
+в один, так что число сегментов растёт примерно как (число постов) / segment_rows.
+"""
+import fcntl
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.core.config import settings
+
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+
+
+class FeatureStore:
+    """Сегментированное хранилище CSR-признаков по id поста"""
+
+    def __init__(
+        self,
+        root: str,
+        namespace: str,
+        model_version: str,
+        segment_rows: int = settings.FEATURE_STORE_SEGMENT_ROWS,
+        merge_segments: int = settings.FEATURE_STORE_MERGE_SEGMENTS,
+        cache_segments: int = settings.FEATURE_STORE_CACHE_SEGMENTS,
+    ):
+        self.directory = os.path.join(root, namespace, model_version)
+        self.model_version = model_version
+        self.segment_rows = segment_rows
+        self.merge_segments = merge_segments
+        self.cache_segments = cache_segments
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._index: List[Dict[str, Any]] = []
+        self._index_stat: Optional[Tuple[int, int]] = None
+        # LRU открытых сегментов: память процесса не растёт вместе с хранилищем
+        self._segments: "OrderedDict[str, Tuple[np.ndarray, sparse.csr_matrix]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def append(self, post_ids, features: sparse.spmatrix) -> Optional[str]:
+        """Дописывает пачку признаков новым сегментом; строки матрицы соответствуют post_ids"""
+        post_ids = np.asarray(post_ids, dtype=np.int64)
+        if not len(post_ids):
+            return None
+
+        order = np.argsort(post_ids, kind="stable")
+        entry = self._write_segment(post_ids[order], sparse.csr_matrix(features)[order])
+
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                index = self._read_index_file()
+                index.append(entry)
+                index, merged = self._compact(index)
+                self._write_index_file(index, entry["name"])
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        # Слитые сегменты удаляются после записи индекса: процессы, уже открывшие
+        # их через mmap, дочитывают старые файлы, остальные перечитают индекс
+        for old in merged:
+            shutil.rmtree(os.path.join(self.directory, old["name"]), ignore_errors=True)
+
+        return entry["name"]
+
+    def _write_segment(self, post_ids: np.ndarray, matrix: sparse.csr_matrix) -> Dict[str, Any]:
+        """Пишет сегмент (post_ids отсортированы) и возвращает его запись для индекса"""
+        matrix.sort_indices()
+
+        name = f"seg_{post_ids[0]:012d}_{post_ids[-1]:012d}_{uuid.uuid4().hex[:8]}"
+        tmp_dir = os.path.join(self.directory, f".{name}.tmp")
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, "ids.npy"), post_ids)
+        np.save(os.path.join(tmp_dir, "data.npy"), matrix.data.astype(np.float32))
+        np.save(os.path.join(tmp_dir, "indices.npy"), matrix.indices.astype(np.int32))
+        np.save(os.path.join(tmp_dir, "indptr.npy"), matrix.indptr.astype(np.int32))
+        os.replace(tmp_dir, os.path.join(self.directory, name))
+
+        return {
+            "name": name,
+            "min_id": int(post_ids[0]),
+            "max_id": int(post_ids[-1]),
+            "rows": int(len(post_ids)),
+            "n_features": int(matrix.shape[1]),
+        }
+
+    def _compact(
+        self, index: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Сливает хвост индекса из маленьких сегментов в один (вызывается под блокировкой
+        индекса). Слитый сегмент встаёт на место хвоста, поэтому порядок перекрытия
+        сохраняется. Возвращает новый индекс и слитые сегменты.
+        """
+        start = len(index)
+        while start > 0 and index[start - 1]["rows"] < self.segment_rows:
+            start -= 1
+        tail = index[start:]
+        if len(tail) < self.merge_segments:
+            return index, []
+
+        ids_parts, matrices = [], []
+        for entry in tail:
+            ids, matrix = self._open_segment(entry)
+            ids_parts.append(np.asarray(ids))
+            matrices.append(matrix)
+        ids = np.concatenate(ids_parts)
+        matrix = sparse.vstack(matrices, format="csr")
+
+        # Для повторно записанного поста остаётся строка из самого позднего сегмента
+        order = np.argsort(ids, kind="stable")
+        ids = ids[order]
+        keep = np.append(ids[1:] != ids[:-1], True)
+        merged = self._write_segment(ids[keep], matrix[order[keep]])
+
+        return index[:start] + [merged], tail
+
+    def read(self, post_ids) -> Tuple[sparse.csr_matrix, np.ndarray]:
+        """
+        Возвращает матрицу признаков в порядке post_ids и маску найденных строк.
+        Для постов, которых нет в хранилище, строка нулевая и found=False.
+        """
+        try:
+            return self._read(post_ids, self._refresh_index())
+        except FileNotFoundError:
+            # Сегмент слит другим процессом после того, как мы прочитали индекс
+            return self._read(post_ids, self._refresh_index(force=True))
+
+    def _read(
+        self, post_ids, index: List[Dict[str, Any]]
+    ) -> Tuple[sparse.csr_matrix, np.ndarray]:
+        post_ids = np.asarray(post_ids, dtype=np.int64)
+        n_features = index[-1]["n_features"] if index else 0
+
+        found = np.zeros(len(post_ids), dtype=bool)
+        source_rows = np.zeros(len(post_ids), dtype=np.int64)
+        source_segment = np.full(len(post_ids), -1, dtype=np.int64)
+
+        if len(post_ids):
+            low, high = post_ids.min(), post_ids.max()
+            # Более поздние сегменты перекрывают ранние (повторная запись того же поста)
+            for number, entry in enumerate(index):
+                if entry["max_id"] < low or entry["min_id"] > high:
+                    continue
+                ids, _ = self._segment(entry)
+                positions = np.minimum(np.searchsorted(ids, post_ids), len(ids) - 1)
+                hit = ids[positions] == post_ids
+                found |= hit
+                source_rows[hit] = positions[hit]
+                source_segment[hit] = number
+
+        parts = []
+        position = np.zeros(len(post_ids), dtype=np.int64)
+        offset = 0
+        for number in np.unique(source_segment[found]):
+            requested = np.flatnonzero(source_segment == number)
+            _, matrix = self._segment(index[number])
+            parts.append(matrix[source_rows[requested]])
+            position[requested] = offset + np.arange(len(requested))
+            offset += len(requested)
+
+        # Ненайденные посты указывают на одну общую нулевую строку в конце
+        parts.append(sparse.csr_matrix((1, n_features), dtype=np.float32))
+        position[~found] = offset
+        result = sparse.vstack(parts, format="csr")[position]
+
+        return result, found
+
+    def _read_index_file(self) -> List[Dict[str, Any]]:
+        path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_index_file(self, index: List[Dict[str, Any]], suffix: str):
+        tmp_path = os.path.join(self.directory, f".{INDEX_FILE}.{suffix}")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, os.path.join(self.directory, INDEX_FILE))
+
+    def _refresh_index(self, force: bool = False) -> List[Dict[str, Any]]:
+        path = os.path.join(self.directory, INDEX_FILE)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return []
+        # index.json заменяется через os.replace, поэтому новый индекс — новый inode
+        key = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            if force or key != self._index_stat:
+                self._index = self._read_index_file()
+                self._index_stat = key
+                names = {entry["name"] for entry in self._index}
+                for name in [n for n in self._segments if n not in names]:
+                    del self._segments[name]
+            return self._index
+
+    def _open_segment(self, entry: Dict[str, Any]) -> Tuple[np.ndarray, sparse.csr_matrix]:
+        directory = os.path.join(self.directory, entry["name"])
+        load = lambda f: np.load(os.path.join(directory, f), mmap_mode="r")
+        ids = load("ids.npy")
+        matrix = sparse.csr_matrix(
+            (load("data.npy"), load("indices.npy"), load("indptr.npy")),
+            shape=(len(ids), entry["n_features"]),
+            copy=False,
+        )
+        return ids, matrix
+
+    def _segment(self, entry: Dict[str, Any]) -> Tuple[np.ndarray, sparse.csr_matrix]:
+        name = entry["name"]
+        with self._lock:
+            segment = self._segments.get(name)
+            if segment is not None:
+                self._segments.move_to_end(name)
+                return segment
+
+        segment = self._open_segment(entry)
+        with self._lock:
+            self._segments[name] = segment
+            while len(self._segments) > self.cache_segments:
+                self._segments.popitem(last=False)
+        return segment
+
+
+_stores: Dict[Tuple[str, str, str], FeatureStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_feature_store(root: str, namespace: str, model_version: str) -> FeatureStore:
+    """Один экземпляр хранилища на (каталог, модель, версию) в процессе"""
+    key = (root, namespace, model_version)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = FeatureStore(root, namespace, model_version)
+            _stores[key] = store
+        return store
@@ -18,6 +18,10 @@ class Channel(Base):
         String(255), nullable=True, index=True
     )
     title: Mapped[str] = mapped_column(String(512), nullable=False)
+    # access_hash аккаунта парсера: канал адресуется через InputPeerChannel без get_entity
+    access_hash: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    # access_hash привязан к аккаунту Telegram, который резолвил канал
+    access_hash_account: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
@@ -33,6 +37,22 @@ class Channel(Base):
     last_parsed_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=True
     )
+    # Курсор инкрементального парсинга: самый новый сохранённый пост канала
+    last_post_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    last_post_date: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    # Контрольная точка backfill: id самого старого догруженного сообщения
+    # (история догружается назад от него) и время окончания догрузки
+    backfill_offset_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    backfill_completed_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    # Когда канал пора парсить снова и текущий интервал (по активности канала)
+    next_parse_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True, index=True
+    )
+    parse_interval_seconds: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
     posts: Mapped[List["Post"]] = relationship(
         "Post",
@@ -8,11 +8,13 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     Integer,
+    String,
     Text,
     Boolean,
     Float,
     UniqueConstraint,
     Index,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -40,6 +42,24 @@ class Post(Base):
     is_problem: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False, index=True)
     problem_probability: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
     problem_confidence: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    # NULL — пост ещё ждёт классификации (задача classify_posts)
+    classified_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    # Версия моделей (тем и проблемности), которыми получена классификация
+    model_version: Mapped[Optional[str]] = mapped_column(
+        String(64), nullable=True, index=True
+    )
+    # SimHash очищенного текста (None — текст слишком короткий для сравнения)
+    simhash: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    # Канонический пост, почти-дубликатом которого является этот пост.
+    # Дубликаты не классифицируются, а получают результаты канонического поста
+    canonical_post_id: Mapped[Optional[int]] = mapped_column(
+        Integer,
+        ForeignKey("posts.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+    )
     
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
@@ -63,6 +83,11 @@ class Post(Base):
         Index("idx_post_topic", "topic", postgresql_using="gin"),
         Index("idx_post_channel_date", "channel_id", "date"),
         Index("idx_post_updated_at", "updated_at"),
+        Index(
+            "idx_post_pending_classification",
+            "id",
+            postgresql_where=text("classified_at IS NULL"),
+        ),
     )
 
     def to_response(self) -> PostResponse:
@@ -79,6 +104,7 @@ class Post(Base):
             is_problem=self.is_problem,
             problem_probability=self.problem_probability,
             problem_confidence=self.problem_confidence,
+            canonical_post_id=self.canonical_post_id,
             created_at=self.created_at,
             updated_at=self.updated_at,
         )
\ No newline at end of file
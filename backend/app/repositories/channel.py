@@ -1,7 +1,7 @@
-from datetime import datetime, timezone
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
 
-from sqlalchemy import select, update, delete
+from sqlalchemy import delete, func, or_, select, update
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
@@ -13,33 +13,73 @@ class ChannelRepository:
     def __init__(self, session: Session):
         self.session = session
 
-    def get_or_create_channel(self, data: ChannelCreate) -> Channel:
-        stmt = (
-            pg_insert(Channel)
-            .values(
-                channel_id=data.channel_id,
-                username=data.username,
-                title=data.title,
-                created_at=datetime.now(timezone.utc),
-                updated_at=datetime.now(timezone.utc),
-            )
-            .on_conflict_do_update(
-                index_elements=["channel_id"],
-                set_={
-                    "username": data.username,
-                    "title": data.title,
-                    "updated_at": datetime.now(timezone.utc),
-                },
-            )
-            .returning(Channel)
+    @staticmethod
+    def _upsert_stmt(rows: List[Dict[str, Any]]):
+        insert_stmt = pg_insert(Channel).values(rows)
+        return insert_stmt.on_conflict_do_update(
+            index_elements=["channel_id"],
+            set_={
+                "username": insert_stmt.excluded.username,
+                "title": insert_stmt.excluded.title,
+                "access_hash": func.coalesce(
+                    insert_stmt.excluded.access_hash, Channel.access_hash
+                ),
+                "access_hash_account": func.coalesce(
+                    insert_stmt.excluded.access_hash_account, Channel.access_hash_account
+                ),
+                "updated_at": datetime.now(timezone.utc),
+            },
         )
 
+    @staticmethod
+    def _row(data: ChannelCreate) -> Dict[str, Any]:
+        return {
+            "channel_id": data.channel_id,
+            "username": data.username,
+            "title": data.title,
+            "access_hash": data.access_hash,
+            "access_hash_account": data.access_hash_account,
+            "created_at": datetime.now(timezone.utc),
+            "updated_at": datetime.now(timezone.utc),
+        }
+
+    def get_or_create_channel(self, data: ChannelCreate) -> Channel:
+        stmt = self._upsert_stmt([self._row(data)]).returning(Channel)
+
         result = self.session.execute(stmt)
         channel = result.scalar_one()
         self.session.commit()
 
         return channel
 
+    def bulk_upsert_channels(self, channels: List[ChannelCreate]) -> int:
+        """Добавляет (или обновляет) каналы одним многострочным upsert"""
+        if not channels:
+            return 0
+        result = self.session.execute(
+            self._upsert_stmt([self._row(data) for data in channels]).returning(Channel.channel_id)
+        )
+        saved = len(result.all())
+        self.session.commit()
+        return saved
+
+    def get_channel_by_username(self, username: str) -> Optional[Channel]:
+        result = self.session.execute(select(Channel).where(Channel.username == username))
+        return result.scalars().first()
+
+    def get_existing_usernames(self, usernames: List[str]) -> Set[str]:
+        """Какие из username уже есть в базе (один запрос по индексу username)"""
+        if not usernames:
+            return set()
+        result = self.session.execute(
+            select(Channel.username).where(Channel.username.in_(usernames))
+        )
+        return set(result.scalars())
+
+    def get_channel(self, channel_id: int) -> Optional[Channel]:
+        result = self.session.execute(select(Channel).where(Channel.channel_id == channel_id))
+        return result.scalar_one_or_none()
+
     def get_all_channels(self) -> List[ChannelResponse]:
         result = self.session.execute(select(Channel))
         return result.scalars().all()
@@ -49,10 +89,74 @@ class ChannelRepository:
         self.session.commit()
         return {"status": "ok"}
 
-    def update_last_parsed(self, channel_id: int, when: datetime):
+    def update_last_parsed(
+        self, channel_id: int, when: datetime, parse_interval_seconds: Optional[int] = None
+    ):
+        values = {"last_parsed_at": when}
+        if parse_interval_seconds is not None:
+            values["parse_interval_seconds"] = parse_interval_seconds
+            values["next_parse_at"] = when + timedelta(seconds=parse_interval_seconds)
+        self.session.execute(
+            update(Channel)
+            .where(Channel.channel_id == channel_id)
+            .values(**values)
+        )
+        self.session.commit()
+
+    def postpone_parse(self, channel_id: int, until: datetime):
+        self.session.execute(
+            update(Channel)
+            .where(Channel.channel_id == channel_id)
+            .values(next_parse_at=until)
+        )
+        self.session.commit()
+
+    def update_backfill_checkpoint(
+        self, channel_id: int, offset_id: int, completed_at: Optional[datetime] = None
+    ):
+        values = {"backfill_offset_id": offset_id}
+        if completed_at is not None:
+            values["backfill_completed_at"] = completed_at
+        self.session.execute(
+            update(Channel)
+            .where(Channel.channel_id == channel_id)
+            .values(**values)
+        )
+        self.session.commit()
+
+    def claim_due_channels(
+        self, now: datetime, lease_until: datetime, limit: Optional[int] = None
+    ) -> List[int]:
+        """
+        Каналы, которым пора парсинг (next_parse_at пуст или прошёл).
+        next_parse_at сразу сдвигается на lease_until, чтобы следующий тик
+        не поставил канал повторно; SKIP LOCKED — на случай нескольких beat.
+        """
+        due = (
+            select(Channel.id)
+            .where(
+                Channel.username.is_not(None),
+                or_(Channel.next_parse_at.is_(None), Channel.next_parse_at <= now),
+            )
+            .order_by(Channel.next_parse_at.asc().nulls_first())
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = self.session.execute(
+            update(Channel)
+            .where(Channel.id.in_(due.scalar_subquery()))
+            .values(next_parse_at=lease_until)
+            .returning(Channel.channel_id)
+            .execution_options(synchronize_session=False)
+        )
+        channel_ids = list(result.scalars())
+        self.session.commit()
+        return channel_ids
+
+    def update_access_hash(self, channel_id: int, access_hash: int, account: str):
         self.session.execute(
             update(Channel)
             .where(Channel.channel_id == channel_id)
-            .values(last_parsed_at=when)
+            .values(access_hash=access_hash, access_hash_account=account)
         )
         self.session.commit()
@@ -1,13 +1,24 @@
 from datetime import date, datetime, timezone
-from typing import List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
+from app.models.channel import Channel
 from app.models.post import Post
 from app.schemas.post import PostCreate, PostResponse, PostTopic
-from app.services.classification_service import classification_service
-from app.services.binary_classif_service import binary_classification_service
-from sqlalchemy import and_, func, select, text
+from sqlalchemy import (
+    BigInteger,
+    Integer,
+    and_,
+    case,
+    column,
+    func,
+    or_,
+    select,
+    text,
+    update,
+    values,
+)
 from sqlalchemy.dialects.postgresql import insert as pg_insert
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, aliased, joinedload
 
 
 class PostRepository:
@@ -19,47 +30,242 @@ class PostRepository:
         posts = result.scalars().all()
         return [post.to_response() for post in posts]
 
-    def bulk_create(self, posts: List[PostCreate]) -> int:
+    def bulk_create(
+        self, posts: List[PostCreate], commit: bool = True
+    ) -> List[Tuple[int, Optional[int]]]:
+        """
+        Вставляет новые посты (уже существующие пропускаются).
+        Возвращает (id, simhash) вставленных постов в порядке вставки.
+        """
         if not posts:
-            return 0
+            return []
 
-        dicts = []
-        for p in posts:
-            predicted_topics = classification_service.predict_topics(p.message)
-
-            problem_prediction = binary_classification_service.predict(p.message)
-
-            dicts.append(
-                {
-                    "channel_id": p.channel_id,
-                    "post_id": p.post_id,
-                    "message": p.message,
-                    "date": p.date,
-                    "views": p.views,
-                    "comments_count": p.comments_count,
-                    "topic": predicted_topics,
-                    "is_problem": problem_prediction["is_problem"],
-                    "problem_probability": problem_prediction["probability"],
-                    "problem_confidence": problem_prediction["confidence"],
-                    "created_at": datetime.now(timezone.utc),
-                }
-            )
+        # Классификация выполняется отдельно задачей classify_posts
+        dicts = [
+            {
+                "channel_id": p.channel_id,
+                "post_id": p.post_id,
+                "message": p.message,
+                "date": p.date,
+                "views": p.views,
+                "comments_count": p.comments_count,
+                "simhash": p.simhash,
+                "classified_at": None,
+                "created_at": datetime.now(timezone.utc),
+            }
+            for p in posts
+        ]
 
         stmt = pg_insert(Post).values(dicts)
         stmt = stmt.on_conflict_do_nothing(index_elements=["channel_id", "post_id"])
+        stmt = stmt.returning(Post.id, Post.simhash)
 
-        self.session.execute(stmt)
+        inserted = [(row.id, row.simhash) for row in self.session.execute(stmt)]
+        if commit:
+            self.session.commit()
+        return sorted(inserted, key=lambda row: row[0])
+
+    def advance_channel_cursor(
+        self,
+        channel_id: int,
+        last_post_id: int,
+        last_post_date: Optional[datetime] = None,
+        commit: bool = True,
+    ):
+        """
+        Сдвигает курсор канала (channels.last_post_id/last_post_date) вперёд,
+        но не назад (GREATEST), в одной транзакции со вставкой постов.
+        Без last_post_date сдвигается только id (после поста шли сообщения без текста).
+        """
+        values = {"last_post_id": func.greatest(Channel.last_post_id, last_post_id)}
+        if last_post_date is not None:
+            is_newer = last_post_id > func.coalesce(Channel.last_post_id, 0)
+            values["last_post_date"] = case(
+                (is_newer, last_post_date), else_=Channel.last_post_date
+            )
+        self.session.execute(
+            update(Channel)
+            .where(Channel.channel_id == channel_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if commit:
+            self.session.commit()
+
+    def link_duplicates(self, links: Dict[int, int]) -> int:
+        """
+        Связывает почти-дубликаты с каноническими постами ({id дубликата: id канонического})
+        и сразу переносит классификацию, если канонический пост уже размечен.
+        Фиксирует транзакцию.
+        """
+        if links:
+            self.session.execute(
+                update(Post),
+                [
+                    {"id": duplicate_id, "canonical_post_id": canonical_id}
+                    for duplicate_id, canonical_id in links.items()
+                ],
+            )
+            self.copy_canonical_classification(duplicate_ids=list(links))
         self.session.commit()
-        return len(dicts)
+        return len(links)
+
+    def copy_canonical_classification(
+        self,
+        duplicate_ids: Optional[List[int]] = None,
+        canonical_ids: Optional[List[int]] = None,
+    ) -> int:
+        """
+        Переносит результаты классификации канонических постов на их дубликаты
+        (UPDATE ... FROM, без фиксации транзакции). Без аргументов обновляет
+        все ещё не размеченные дубликаты, чей канонический пост уже размечен.
+        """
+        canonical = aliased(Post)
+        stmt = update(Post).where(
+            Post.canonical_post_id == canonical.id,
+            canonical.classified_at.is_not(None),
+        )
+        if duplicate_ids is not None:
+            stmt = stmt.where(Post.id.in_(duplicate_ids))
+        if canonical_ids is not None:
+            stmt = stmt.where(canonical.id.in_(canonical_ids))
+        if duplicate_ids is None and canonical_ids is None:
+            stmt = stmt.where(Post.classified_at.is_(None))
 
-    def get_last_post(self, channel_id: int) -> Optional[Post]:
         result = self.session.execute(
-            select(Post)
-            .where(Post.channel_id == channel_id)
-            .order_by(Post.post_id.desc())
-            .limit(1)
+            stmt.values(
+                topic=canonical.topic,
+                is_problem=canonical.is_problem,
+                problem_probability=canonical.problem_probability,
+                problem_confidence=canonical.problem_confidence,
+                model_version=canonical.model_version,
+                classified_at=canonical.classified_at,
+                updated_at=datetime.now(timezone.utc),
+            ).execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    def get_pending_classification(self, limit: int) -> List[Tuple[int, str]]:
+        """
+        Берёт пачку неклассифицированных постов с блокировкой строк.
+        SKIP LOCKED позволяет нескольким воркерам разбирать очередь параллельно.
+        Дубликаты пропускаются: они получают результаты канонических постов.
+        """
+        result = self.session.execute(
+            select(Post.id, Post.message)
+            .where(Post.classified_at.is_(None), Post.canonical_post_id.is_(None))
+            .order_by(Post.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return result.all()
+
+    def bulk_update_classification(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Массово записывает результаты классификации (по id), переносит их
+        на дубликаты этих постов и фиксирует транзакцию
+        """
+        if not rows:
+            self.session.commit()
+            return 0
+
+        self.session.execute(update(Post), rows)
+        self.copy_canonical_classification(canonical_ids=[row["id"] for row in rows])
+        self.session.commit()
+        return len(rows)
+
+    def get_classified_after(
+        self, after_id: int, limit: int, model_version: str
+    ) -> List[Tuple[int, str]]:
+        """
+        Следующая пачка уже классифицированных постов с id > after_id (keyset-пагинация),
+        размеченных не текущей версией моделей
+        """
+        result = self.session.execute(
+            select(Post.id, Post.message)
+            .where(
+                and_(
+                    Post.id > after_id,
+                    Post.classified_at.is_not(None),
+                    Post.canonical_post_id.is_(None),
+                    Post.model_version.is_distinct_from(model_version),
+                )
+            )
+            .order_by(Post.id)
+            .limit(limit)
+        )
+        return result.all()
+
+    def get_messages_by_ids(self, ids: List[int]) -> List[Tuple[int, str]]:
+        """Тексты постов по id (без загрузки ORM-объектов)"""
+        if not ids:
+            return []
+        result = self.session.execute(
+            select(Post.id, Post.message).where(Post.id.in_(ids)).order_by(Post.id)
+        )
+        return result.all()
+
+    def get_recent_post_ids(self, since: datetime) -> Dict[int, List[int]]:
+        """id постов (в Telegram) по каналам, опубликованных после since"""
+        result = self.session.execute(
+            select(Post.channel_id, Post.post_id)
+            .where(Post.date >= since)
+            .order_by(Post.channel_id, Post.post_id)
+        )
+        post_ids: Dict[int, List[int]] = {}
+        for channel_id, post_id in result:
+            post_ids.setdefault(channel_id, []).append(post_id)
+        return post_ids
+
+    def bulk_update_engagement(
+        self, channel_id: int, rows: List[Tuple[int, int, int]]
+    ) -> int:
+        """
+        Записывает просмотры и число комментариев ((post_id, views, comments_count))
+        одним UPDATE ... FROM (VALUES ...). Строки без изменений не трогаются.
+        Фиксирует транзакцию, возвращает число обновлённых постов.
+        """
+        if not rows:
+            return 0
+
+        data = values(
+            column("post_id", BigInteger),
+            column("views", Integer),
+            column("comments_count", Integer),
+            name="engagement",
+        ).data(rows)
+
+        result = self.session.execute(
+            update(Post)
+            .where(
+                Post.channel_id == channel_id,
+                Post.post_id == data.c.post_id,
+                or_(
+                    Post.views.is_distinct_from(data.c.views),
+                    Post.comments_count.is_distinct_from(data.c.comments_count),
+                ),
+            )
+            .values(
+                views=data.c.views,
+                comments_count=data.c.comments_count,
+                updated_at=datetime.now(timezone.utc),
+            )
+            .execution_options(synchronize_session=False)
         )
-        return result.scalar_one_or_none()
+        self.session.commit()
+        return result.rowcount
+
+    def count_posts_since(self, channel_id: int, since: datetime) -> int:
+        result = self.session.execute(
+            select(func.count(Post.id)).where(Post.channel_id == channel_id, Post.date >= since)
+        )
+        return result.scalar_one()
+
+    def get_oldest_post_id(self, channel_id: int) -> Optional[int]:
+        result = self.session.execute(
+            select(func.min(Post.post_id)).where(Post.channel_id == channel_id)
+        )
+        return result.scalar_one()
 
     def get_posts_by_topic(self, topic: PostTopic) -> List[PostResponse]:
         query = (
@@ -102,16 +308,15 @@ class PostRepository:
         return self._execute_query_to_responses(query)
 
     def get_posts_counts_by_date(
-        self, date_from: date, date_to: date
+        self, date_from: date, date_to: date, canonical_only: bool = False
     ) -> List[Tuple[date, int]]:
+        conditions = [Post.date.between(date_from, date_to), Post.is_problem.is_(True)]
+        if canonical_only:
+            conditions.append(Post.canonical_post_id.is_(None))
+
         result = self.session.execute(
             select(func.date(Post.date), func.count(Post.id))
-            .where(
-                and_(
-                    Post.date.between(date_from, date_to),
-                    Post.is_problem.is_(True)
-                )
-            )
+            .where(and_(*conditions))
             .group_by(func.date(Post.date))
             .order_by(func.date(Post.date))
         )
@@ -119,11 +324,12 @@ class PostRepository:
         return result.all()
 
     def get_posts_counts_by_topic(
-        self, date_from: date, date_to: date
+        self, date_from: date, date_to: date, canonical_only: bool = False
     ) -> List[Tuple[str, int]]:
+        canonical_filter = "AND canonical_post_id IS NULL" if canonical_only else ""
         result = self.session.execute(
             text(
-                """
+                f"""
                 SELECT 
                     jsonb_array_elements_text(topic) as topic_name,
                     COUNT(*) as count
@@ -131,6 +337,7 @@ class PostRepository:
                 WHERE date BETWEEN :date_from AND :date_to
                 AND topic != '[]'::jsonb  -- Исключаем пустые массивы
                 AND is_problem  
+                {canonical_filter}
                 GROUP BY jsonb_array_elements_text(topic)
                 ORDER BY count DESC
             """
@@ -5,8 +5,10 @@ from app.core.database import get_session
 from app.repositories.post import PostRepository
 from app.repositories.channel import ChannelRepository
 from app.schemas.post import PostsByDateResponse, PostsByTopicResponse
-from app.schemas.post import PostResponse, PostTopic
+from app.schemas.post import PostExplanation, PostResponse, PostTopic
 from app.schemas.channel import ChannelResponse
+from app.services.post_classifier import post_classifier
+from app.services.prediction_cache import prediction_cache
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 
@@ -17,10 +19,11 @@ router = APIRouter(prefix="/analytics", tags=["analytics"])
 async def get_posts_count_by_date(
     date_from: date = Query(..., description="Дата в формате YYYY-MM-DD"),
     date_to: date = Query(..., description="Дата в формате YYYY-MM-DD"),
+    canonical_only: bool = Query(False, description="Не считать почти-дубликаты постов"),
     db: Session = Depends(get_session),
 ) -> PostsByDateResponse:
     repo = PostRepository(db)
-    data = repo.get_posts_counts_by_date(date_from, date_to)
+    data = repo.get_posts_counts_by_date(date_from, date_to, canonical_only)
 
     dates = [item[0].isoformat() for item in data]
     counts = [item[1] for item in data]
@@ -32,10 +35,11 @@ async def get_posts_count_by_date(
 async def get_posts_count_by_topic(
     date_from: date = Query(..., description="Дата в формате YYYY-MM-DD"),
     date_to: date = Query(..., description="Дата в формате YYYY-MM-DD"),
+    canonical_only: bool = Query(False, description="Не считать почти-дубликаты постов"),
     db: Session = Depends(get_session),
 ) -> PostsByTopicResponse:
     repo = PostRepository(db)
-    data = repo.get_posts_counts_by_topic(date_from, date_to)
+    data = repo.get_posts_counts_by_topic(date_from, date_to, canonical_only)
 
     topics = [item[0] for item in data]
     counts = [item[1] for item in data]
@@ -76,6 +80,27 @@ async def get_posts_by_date_and_topic(
 
     return posts
 
+@router.get("/posts/explain")
+async def explain_posts(
+    ids: List[int] = Query(..., description="ID постов в базе"),
+    top_n: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_session),
+) -> List[PostExplanation]:
+    repo = PostRepository(db)
+    rows = repo.get_messages_by_ids(ids)
+    if not rows:
+        return []
+
+    post_ids = [row[0] for row in rows]
+    explanations = post_classifier.explain_posts(
+        post_ids, [row[1] for row in rows], top_n=top_n
+    )
+
+    return [
+        {"id": post_id, **explanation}
+        for post_id, explanation in zip(post_ids, explanations)
+    ]
+
 @router.get("/channels")
 async def get_all_channels(
     db: Session = Depends(get_session)
@@ -92,3 +117,8 @@ async def delete_channel(
 ):
     repo = ChannelRepository(db)
     return repo.delete_channel(channel_id)
+
+
+@router.get("/classification-cache")
+async def get_classification_cache_stats():
+    return prediction_cache.stats()
@@ -1,18 +1,90 @@
-from fastapi import APIRouter
+from typing import List, Optional
+
+from celery.result import AsyncResult
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 
 from app.core.celery_app import celery_app
-from app.tasks.channel_cycle import parse_channels_cycle_task, parse_channel_info_task
+from app.services.parse_coordinator import parse_coordinator
+from app.tasks.channel_cycle import (
+    backfill_channel_task,
+    import_channels_task,
+    parse_channel_info_task,
+    parse_channels_cycle_task,
+)
+from app.services.model_registry import request_reload
+from app.tasks.classification import reclassify_posts_task
 
 router = APIRouter(tags=["parsing"])
 
 
 @router.post("/parse")
 async def start_parsing():
+    # Пока цикл идёт, повторный запуск не ставит новых задач
+    running = parse_coordinator.current_cycle()
+    if running is not None:
+        return {"status": "already_running", "cycle_id": running}
     parse_channels_cycle_task.delay()
     return {"status": "queued"}
 
 
+@router.get("/parse/status")
+async def parsing_status():
+    return parse_coordinator.status()
+
+
 @router.post("/channel")
 async def add_channel(channel_link: str):
     parse_channel_info_task.delay(channel_link)
     return {"status": "queued"}
+
+
+@router.post("/channels/import")
+async def import_channels(
+    links: List[str] = Form(default=[]),
+    file: Optional[UploadFile] = File(default=None),
+):
+    """Массовый импорт каналов: список ссылок и/или файл (по ссылке на строку)"""
+    channel_links = [link for item in links for link in item.split()]
+    if file is not None:
+        content = (await file.read()).decode("utf-8", errors="ignore")
+        channel_links.extend(content.replace(",", " ").split())
+
+    if not channel_links:
+        raise HTTPException(status_code=400, detail="Список каналов пуст")
+
+    task = import_channels_task.delay(channel_links)
+    return {"status": "queued", "task_id": task.id, "links": len(channel_links)}
+
+
+@router.get("/channels/import/{task_id}")
+async def import_channels_status(task_id: str):
+    task_result = AsyncResult(task_id, app=celery_app)
+    response = {"task_id": task_id, "status": task_result.state}
+
+    if task_result.state == "PROGRESS":
+        response["progress"] = task_result.info
+    elif task_result.state == "SUCCESS":
+        response["result"] = task_result.result
+    elif task_result.state == "FAILURE":
+        response["error"] = str(task_result.result)
+
+    return response
+
+
+@router.post("/channels/{channel_id}/backfill")
+async def start_backfill(channel_id: int):
+    task = backfill_channel_task.delay(channel_id)
+    return {"status": "queued", "task_id": task.id}
+
+
+@router.post("/reclassify")
+async def start_reclassification():
+    task = reclassify_posts_task.delay()
+    return {"status": "queued", "task_id": task.id}
+
+
+@router.post("/models/reload")
+async def reload_models():
+    """Перечитывает модели с настроенных путей во всех процессах (после замены файлов)"""
+    subscribers = request_reload()
+    return {"status": "published", "subscribers": subscribers}
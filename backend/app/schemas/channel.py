@@ -11,7 +11,9 @@ class ChannelBase(BaseModel):
 
 
 class ChannelCreate(ChannelBase):
-    pass
+    # Нужен для обращения к каналу без resolve по username, наружу не отдаётся
+    access_hash: Optional[int] = Field(default=None, exclude=True)
+    access_hash_account: Optional[str] = Field(default=None, exclude=True)
 
 class ChannelResponse(ChannelBase):
     id: int = Field(..., description="Внутренний ID в базе")
@@ -28,6 +28,7 @@ class PostCreate(BaseModel):
     views: Optional[int] = None
     comments_count: int = 0
     topic: List[str] = []
+    simhash: Optional[int] = Field(default=None, exclude=True)
 
     @field_validator('topic')
     @classmethod
@@ -67,6 +68,10 @@ class PostResponse(PostCreate):
         le=1.0, 
         description="Уверенность модели в предсказании"
     )
+    canonical_post_id: Optional[int] = Field(
+        default=None,
+        description="ID канонического поста, если этот пост — почти-дубликат",
+    )
     model_config = ConfigDict(from_attributes=True)
 
 class PostsByDateResponse(BaseModel):
@@ -78,4 +83,17 @@ class PostsByTopicResponse(BaseModel):
     counts: List[int]
 
 class Summary(BaseModel):
-    summary: str
\ No newline at end of file
+    summary: str
+
+
+class FeatureContribution(BaseModel):
+    feature: str
+    weight: float = Field(..., description="Коэффициент признака в модели")
+    importance: float = Field(..., description="Вклад признака: tfidf * вес")
+    tfidf_value: float
+
+
+class PostExplanation(BaseModel):
+    id: int
+    problem_features: List[FeatureContribution]
+    non_problem_features: List[FeatureContribution]
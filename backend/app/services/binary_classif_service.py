@@ -1,7 +1,21 @@
-from typing import Dict, Optional, Any
+from typing import Dict, List, NamedTuple, Optional, Any
+import io
 import joblib
+import threading
 import traceback
 import numpy as np
+from scipy.special import expit
+
+from app.core.config import settings
+from app.ml.artifacts import MappedLinearModel, content_version, is_artifacts_dir
+
+
+class BinaryPredictions(NamedTuple):
+    """Результаты пакетной классификации, по элементу на каждый текст"""
+
+    is_problem: np.ndarray
+    probability: np.ndarray
+    confidence: np.ndarray
 
 
 class BinaryClassificationService:
@@ -9,13 +23,57 @@ class BinaryClassificationService:
     
     def __init__(
         self,
-        model_path: str = "/home/saryglar311/Projects/DIPLOM/backend/app/ml/LR/logistic_regression_model_neg.pkl",
+        model_path: str = settings.PROBLEM_MODEL_PATH,
     ):
         self.threshold = 0.5
-        
-        # Загружаем модель
+        self.model = None
+        self.classifier = None
+        self.vectorizer = None
+        self.classes_ = None
+        self._coef = None
+        self._intercept = None
+        self._feature_names = None
+        self.scoring_strategy = None
+
+        # Модель загружается лениво при первом предсказании (или в warm_up)
+        self.model_path = model_path
+        self._model_version = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    @property
+    def model_version(self) -> str:
+        """Версия загруженной модели: считается по тем же байтам, из которых она загружена"""
+        self._ensure_loaded()
+        return self._model_version
+
+    def _ensure_loaded(self):
+        """Потокобезопасно загружает модель, если она ещё не загружена"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._load_model(self.model_path)
+            self._loaded = True
+
+    def warm_up(self) -> "BinaryClassificationService":
+        """Заранее загружает модель в процессах, которые занимаются классификацией"""
+        self._ensure_loaded()
+        return self
+
+    def _load_model(self, model_path: str):
+        """Загружает пайплайн бинарной классификации (.pkl или каталог memory-mapped артефактов)"""
+        if is_artifacts_dir(model_path):
+            self._load_artifacts(model_path)
+            return
+
         print(f"Загрузка модели из {model_path}")
-        self.model = joblib.load(model_path)
+        # Файл читается один раз: версия и модель берутся из одних и тех же байтов
+        with open(model_path, "rb") as f:
+            data = f.read()
+        self.model = joblib.load(io.BytesIO(data))
+        self._model_version = content_version(data)
         
         # Проверяем, что это Pipeline
         if not hasattr(self.model, 'named_steps'):
@@ -26,55 +84,151 @@ class BinaryClassificationService:
         
         # Получаем классификатор для диагностики
         self.classifier = self.model.named_steps['clf']
+        self.vectorizer = self.model.named_steps['tfidf']
+        self.classes_ = self.classifier.classes_
+        if hasattr(self.classifier, 'coef_'):
+            self._coef = self.classifier.coef_.T
         print(f"Классы классификатора: {self.classifier.classes_}")
-    
-    def _safe_predict_proba(self, text: str):
-        """Безопасное получение вероятностей с обходом ошибки multi_class"""
+
+        self.scoring_strategy = self._resolve_scoring_strategy()
+        print(f"Способ получения вероятностей: {self.scoring_strategy}")
+
+    def _load_artifacts(self, directory: str):
+        """Загружает линейную модель из каталога артефактов, общего для всех процессов"""
+        mapped = MappedLinearModel(directory)
+        self.model = None
+        self.classifier = None
+        self.vectorizer = mapped.vectorizer
+        self.classes_ = np.asarray(mapped.manifest["classes"])
+        self._coef = mapped.coef
+        self._intercept = mapped.intercept
+        self.scoring_strategy = "linear"
+        self._model_version = mapped.version
+        print(f"Модель загружена из артефактов {directory}. Классы: {self.classes_}")
+
+    def _resolve_scoring_strategy(self) -> str:
+        """
+        Один раз при загрузке выбирает способ получения вероятностей:
+        predict_proba, decision_function + сигмоида или жёсткий predict
+        (обход ошибки multi_class у моделей из другой версии sklearn)
+        """
         try:
-            # Пробуем стандартный способ
-            return self.model.predict_proba([text])[0]
+            self.model.predict_proba([""])
+            return "predict_proba"
         except AttributeError as e:
-            if "'multi_class'" in str(e):
-                print("Обнаружена ошибка с multi_class, используем обходной путь")
-                
-                # Обходной путь 1: Используем decision_function если доступен
-                if hasattr(self.classifier, 'decision_function'):
-                    try:
-                        # Получаем текстовый вектор через TF-IDF
-                        vectorizer = self.model.named_steps['tfidf']
-                        text_vec = vectorizer.transform([text])
-                        decision = self.classifier.decision_function(text_vec)[0]
-                        
-                        # Преобразуем decision function в вероятность
-                        # Для бинарной классификации используем сигмоиду
-                        prob = 1 / (1 + np.exp(-decision))
-                        
-                        if len(self.classifier.classes_) == 2:
-                            # Для бинарной классификации
-                            return np.array([1 - prob, prob])
-                        else:
-                            return np.array([prob])
-                    except Exception as e:
-                        print(f"Ошибка в decision_function: {e}")
-                
-                # Обходной путь 2: Используем predict и возвращаем бинарные вероятности
-                prediction = self.model.predict([text])[0]
-                
-                if len(self.classifier.classes_) == 2:
-                    # Для бинарной классификации
-                    if prediction == 1:
-                        return np.array([0.0, 1.0])
-                    else:
-                        return np.array([1.0, 0.0])
-                else:
-                    # Для многоклассовой
-                    probs = np.zeros(len(self.classifier.classes_))
-                    probs[prediction] = 1.0
-                    return probs
-            else:
-                # Если это не ошибка multi_class, пробрасываем дальше
+            if "'multi_class'" not in str(e):
                 raise
-    
+            print("Обнаружена ошибка с multi_class, используем обходной путь")
+
+        if hasattr(self.classifier, 'decision_function'):
+            try:
+                self.classifier.decision_function(self.vectorizer.transform([""]))
+                return "decision_function"
+            except Exception as e:
+                print(f"Ошибка в decision_function: {e}")
+
+        return "predict"
+
+    def _predict_proba_batch(self, texts: List[str]) -> np.ndarray:
+        """Вероятности классов для пачки текстов: (n_texts, n_classes)"""
+        return self._proba_from_features(self.vectorizer.transform(texts))
+
+    def _proba_from_features(self, features) -> np.ndarray:
+        """
+        Вероятности классов по матрице TF-IDF признаков.
+        Пайплайн состоит из шагов tfidf -> clf, поэтому классификатор
+        можно вызывать напрямую на признаках.
+        """
+        n_classes = len(self.classes_)
+
+        if self.scoring_strategy == "linear":
+            prob = expit(features @ self._coef + self._intercept)[:, 0]
+            return np.column_stack([1 - prob, prob])
+
+        if self.scoring_strategy == "predict_proba":
+            return self.classifier.predict_proba(features)
+
+        if self.scoring_strategy == "decision_function":
+            decision = self.classifier.decision_function(features)
+            prob = expit(decision)
+            if n_classes == 2:
+                return np.column_stack([1 - prob, prob])
+            return prob
+
+        predictions = self.classifier.predict(features)
+        return (predictions[:, None] == self.classes_[None, :]).astype(float)
+
+    def vectorize(self, texts: List[str]):
+        """TF-IDF признаки текстов: по строке на каждый текст, включая пустые"""
+        self._ensure_loaded()
+        return self.vectorizer.transform(texts)
+
+    @staticmethod
+    def _problem_probability(proba: np.ndarray) -> np.ndarray:
+        """Вероятность класса "Проблема": класс 1 при бинарной классификации"""
+        return proba[:, 1] if proba.shape[1] == 2 else proba[:, 0]
+
+    def predict_batch(
+        self, texts: List[str], threshold: Optional[float] = None
+    ) -> BinaryPredictions:
+        """
+        Пакетное предсказание для списка текстов одним векторизованным вызовом
+        """
+        self._ensure_loaded()
+        scored = self._scored_mask(texts)
+        features = None
+        if scored.any():
+            features = self.vectorizer.transform(
+                [text for text, ok in zip(texts, scored) if ok]
+            )
+        return self._predictions_from_features(features, scored, threshold)
+
+    def predict_batch_from_features(
+        self, features, texts: List[str], threshold: Optional[float] = None
+    ) -> BinaryPredictions:
+        """Пакетное предсказание по уже посчитанным признакам (строки features соответствуют texts)"""
+        self._ensure_loaded()
+        scored = self._scored_mask(texts)
+        return self._predictions_from_features(features[scored], scored, threshold)
+
+    @staticmethod
+    def _scored_mask(texts: List[str]) -> np.ndarray:
+        return np.array([bool(text and text.strip()) for text in texts], dtype=bool)
+
+    def _predictions_from_features(
+        self, features, scored: np.ndarray, threshold: Optional[float]
+    ) -> BinaryPredictions:
+        if threshold is None:
+            threshold = self.threshold
+
+        probability = np.zeros(len(scored), dtype=float)
+
+        if scored.any():
+            try:
+                probability[scored] = self._problem_probability(
+                    self._proba_from_features(features)
+                )
+            except Exception as e:
+                print(f"Ошибка пакетного предсказания, используем predict: {e}")
+                try:
+                    probability[scored] = (self.classifier.predict(features) == 1).astype(float)
+                except Exception:
+                    traceback.print_exc()
+                    scored = np.zeros_like(scored)
+
+        is_problem = scored & (probability >= threshold)
+        confidence = np.where(scored, np.abs(probability - 0.5) * 2, 0.0)
+
+        return BinaryPredictions(
+            is_problem=is_problem,
+            probability=probability,
+            confidence=confidence,
+        )
+
+    def _safe_predict_proba(self, text: str):
+        """Безопасное получение вероятностей с обходом ошибки multi_class"""
+        return self._predict_proba_batch([text])[0]
+
     def predict(self, text: str, threshold: Optional[float] = None) -> Dict[str, Any]:
         """
         Предсказывает, является ли текст проблемой
@@ -94,6 +248,7 @@ class BinaryClassificationService:
             return result
             
         try:
+            self._ensure_loaded()
             # Используем безопасный метод получения вероятностей
             proba = self._safe_predict_proba(text)
             
@@ -143,65 +298,74 @@ class BinaryClassificationService:
             "non_problem_features": [],
             "text": text
         }
-        
+
         try:
-            # Проверяем, что модель имеет нужные атрибуты
-            if not hasattr(self.classifier, 'coef_'):
-                return result
-            
-            # Получаем векторизатор
-            vectorizer = self.model.named_steps['tfidf']
-            
-            # Преобразуем текст в вектор
-            text_vec = vectorizer.transform([text])
-            
-            # Получаем имена признаков и коэффициенты
-            feature_names = vectorizer.get_feature_names_out()
-            coefficients = self.classifier.coef_[0]
-            
-            # Находим ненулевые признаки в тексте
-            nonzero_indices = text_vec.nonzero()[1]
-            
-            # Собираем признаки - ВАЖНО: конвертируем numpy типы
-            text_features = []
-            for idx in nonzero_indices:
-                feature_name = feature_names[idx]
-                weight = coefficients[idx]
-                tfidf_value = text_vec[0, idx]
-                importance = tfidf_value * weight
-                
-                text_features.append({
-                    'feature': feature_name,
-                    'weight': float(weight),  # Конвертируем np.float64 в float
-                    'importance': float(importance),  # Конвертируем np.float64 в float
-                    'tfidf_value': float(tfidf_value)  # Конвертируем np.float64 в float
-                })
-            
-            # Сортируем по абсолютной важности
-            text_features.sort(key=lambda x: abs(x['importance']), reverse=True)
-            
-            # Разделяем на признаки проблемы и не-проблемы
-            problem_features = [f for f in text_features if f['weight'] > 0]
-            non_problem_features = [f for f in text_features if f['weight'] < 0]
-            
-            result['problem_features'] = problem_features[:top_n]
-            result['non_problem_features'] = non_problem_features[:top_n]
-            
-            print(f"\nТоп-{top_n} признаков для текста:")
-            print("Указывают на проблему:")
-            for f in result['problem_features']:
-                print(f"  {f['feature']}: вес={f['weight']:.4f}, важность={f['importance']:.4f}")
-            
-            print("\nУказывают на НЕ проблему:")
-            for f in result['non_problem_features']:
-                print(f"  {f['feature']}: вес={f['weight']:.4f}, важность={f['importance']:.4f}")
-            
+            result.update(self.explain_batch([text], top_n=top_n)[0])
         except Exception as e:
             print(f"Ошибка при получении топ-признаков: {e}")
             traceback.print_exc()
-            
+
         return result
 
+    def feature_names(self) -> np.ndarray:
+        """Имена признаков векторизатора (материализуются один раз)"""
+        self._ensure_loaded()
+        if self._feature_names is None:
+            self._feature_names = self.vectorizer.get_feature_names_out()
+        return self._feature_names
+
+    def explain_batch(
+        self, texts: Optional[List[str]] = None, features=None, top_n: int = 10
+    ) -> List[Dict[str, List[Dict[str, Any]]]]:
+        """
+        Топ признаков «за» и «против» проблемы для пачки текстов
+        (или уже посчитанных TF-IDF признаков). Вклад признака — tfidf * вес.
+        """
+        self._ensure_loaded()
+        if features is None:
+            features = self.vectorizer.transform(texts)
+
+        if self._coef is None:
+            return [
+                {"problem_features": [], "non_problem_features": []}
+                for _ in range(features.shape[0])
+            ]
+
+        coefficients = np.asarray(self._coef[:, 0])
+        contributions = features.multiply(coefficients).tocsr()
+        feature_names = self.feature_names()
+
+        explanations = []
+        for row in range(features.shape[0]):
+            start, end = contributions.indptr[row], contributions.indptr[row + 1]
+            indices = contributions.indices[start:end]
+            importance = contributions.data[start:end]
+            weights = coefficients[indices]
+
+            explanation = {}
+            for key, selected in (
+                ("problem_features", importance > 0),
+                ("non_problem_features", importance < 0),
+            ):
+                candidates = np.flatnonzero(selected)
+                if candidates.size > top_n:
+                    candidates = candidates[
+                        np.argpartition(-np.abs(importance[candidates]), top_n - 1)[:top_n]
+                    ]
+                candidates = candidates[np.argsort(-np.abs(importance[candidates]))]
+                explanation[key] = [
+                    {
+                        "feature": str(feature_names[indices[i]]),
+                        "weight": float(weights[i]),
+                        "importance": float(importance[i]),
+                        "tfidf_value": float(importance[i] / weights[i]),
+                    }
+                    for i in candidates
+                ]
+            explanations.append(explanation)
+
+        return explanations
+
 
 # Создаем глобальный экземпляр
 binary_classification_service = BinaryClassificationService()
\ No newline at end of file
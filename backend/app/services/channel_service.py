@@ -1,12 +1,17 @@
 #services/channel_service.py
 import asyncio
-from datetime import datetime, timezone
-from typing import Any, Dict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
 import logging
 
+from app.core.config import settings
+from app.custom_classes.telegram_parser import FetchStats
+from app.dependencies.telegram_client import AccountRing
+from app.exceptions.custom_exceptions import RateLimitException
 from app.repositories.channel import ChannelRepository
 from app.repositories.post import PostRepository
 from app.schemas.channel import ChannelCreate
+from app.services.parse_scheduler import ParseScheduler, parse_scheduler
 from app.services.parser_service import ParserService
 
 
@@ -19,26 +24,42 @@ class ChannelService:
         channel_repo: ChannelRepository,
         post_repo: PostRepository,
         parser_service: ParserService,
+        parser_services: Optional[Dict[str, ParserService]] = None,
+        account_ring: Optional[AccountRing] = None,
+        scheduler: ParseScheduler = parse_scheduler,
     ):
         self.channel_repo = channel_repo
         self.post_repo = post_repo
+        # parser_service — аккаунт по умолчанию, parser_services — все подключённые аккаунты
         self.parser_service = parser_service
+        self.parser_services = parser_services or {parser_service.parser.account: parser_service}
+        self.account_ring = account_ring or AccountRing(self.parser_services)
+        self.scheduler = scheduler
+
+    def accounts_for(self, channel_id: Union[int, str]) -> List[str]:
+        """
+        Подключённые аккаунты для канала: основной по консистентному хэшированию,
+        затем запасные. Аккаунты под долгим FloodWait уходят в конец списка.
+        """
+        accounts = [
+            account
+            for account in self.account_ring.accounts_for(channel_id)
+            if account in self.parser_services
+        ] or list(self.parser_services)
+
+        def throttled(account: str) -> bool:
+            limiter = self.parser_services[account].parser.rate_limiter
+            return limiter.throttled_for() > settings.TG_FAILOVER_WAIT
+
+        return sorted(accounts, key=throttled)
 
     async def add_channel_if_not_exists(self, channel_link: str):
-        # Извлекаем username разными способами
-        username = None
-        if channel_link.startswith("@"):
-            username = channel_link.lstrip("@")
-        elif channel_link.startswith("https://t.me/"):
-            username = channel_link.split("t.me/")[-1].split("?")[0].strip("/")
-        else:
-            username = channel_link.strip()
+        username = extract_username(channel_link)
         
         logger.info(f"Добавление канала: {channel_link} -> username: {username}")
 
         # Проверяем существование канала
-        existing_channels = self.channel_repo.get_all_channels()
-        channel = next((c for c in existing_channels if c.username == username), None)
+        channel = self.channel_repo.get_channel_by_username(username)
         if channel:
             logger.info(f"Канал уже существует: {username} (ID: {channel.channel_id})")
         
@@ -50,6 +71,8 @@ class ChannelService:
                 channel_id=info["id"],
                 username=info["username"],
                 title=info["title"],
+                access_hash=info["access_hash"],
+                access_hash_account=self.parser_service.parser.account,
             )
 
             channel = self.channel_repo.get_or_create_channel(data)
@@ -65,137 +88,415 @@ class ChannelService:
             "title": channel.title
         }
 
+    async def import_channels(
+        self,
+        channel_links: List[str],
+        max_concurrent: int = 5,  # на один аккаунт
+        on_progress: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Массовое добавление каналов. Уже известные отсеиваются одним запросом
+        username IN (...), новые резолвятся параллельно на всех аккаунтах
+        (с учётом их rate limiter) и записываются одним upsert.
+        on_progress получает счётчики после каждого резолва.
+        """
+        usernames = list(dict.fromkeys(filter(None, map(extract_username, channel_links))))
+        existing = self.channel_repo.get_existing_usernames(usernames)
+        new_usernames = [u for u in usernames if u not in existing]
+        logger.info(
+            f"Импорт каналов: {len(usernames)} ссылок, уже добавлено {len(existing)}, "
+            f"резолвим {len(new_usernames)}"
+        )
+
+        progress = {
+            "total": len(new_usernames),
+            "existing": len(existing),
+            "resolved": 0,
+            "failed": 0,
+            "throttled": 0,
+        }
+        errors: Dict[str, str] = {}
+        resolved: Dict[int, ChannelCreate] = {}
+
+        semaphores = {
+            account: asyncio.Semaphore(max_concurrent) for account in self.parser_services
+        }
+
+        async def resolve_one(username: str):
+            accounts = self.accounts_for(username)
+            for attempt, account in enumerate(accounts):
+                try:
+                    async with semaphores[account]:
+                        info = await self.parser_services[account].parser.get_channel_info(
+                            f"@{username}"
+                        )
+                    break
+                except RateLimitException as e:
+                    if attempt == len(accounts) - 1:
+                        progress["throttled"] += 1
+                        errors[username] = str(e)
+                        return
+                except Exception as e:
+                    progress["failed"] += 1
+                    errors[username] = str(e)
+                    return
+
+            # Разные ссылки могут вести на один канал: в upsert он попадёт один раз
+            resolved[info["id"]] = ChannelCreate(
+                channel_id=info["id"],
+                username=info["username"],
+                title=info["title"],
+                access_hash=info["access_hash"],
+                access_hash_account=account,
+            )
+            progress["resolved"] += 1
+
+        async def resolve_and_report(username: str):
+            await resolve_one(username)
+            if on_progress is not None:
+                on_progress(dict(progress))
+
+        await asyncio.gather(*(resolve_and_report(u) for u in new_usernames))
+
+        saved = self.channel_repo.bulk_upsert_channels(list(resolved.values()))
+        logger.info(
+            f"Импорт каналов завершён: добавлено {saved}, ошибок {progress['failed']}, "
+            f"упёрлись в лимит {progress['throttled']}"
+        )
+        return {**progress, "saved": saved, "errors": errors, "channel_ids": list(resolved)}
+
+    async def backfill_channel(
+        self, channel_id: int, time_budget: float = settings.BACKFILL_TIME_BUDGET
+    ) -> Dict[str, Any]:
+        """
+        Догружает историю канала назад, начиная с контрольной точки
+        (или с самого старого сохранённого поста). Контрольная точка пишется
+        после каждой страницы, так что задачу можно прервать и перезапустить.
+        """
+        channel = self.channel_repo.get_channel(channel_id)
+        if channel is None or not channel.username:
+            return {"channel": channel_id, "status": "skipped", "error": "Channel not found"}
+        if channel.backfill_completed_at is not None:
+            return {"channel": channel.username, "status": "already_completed"}
+        if channel.last_parsed_at is None:
+            # Сначала обычный цикл забирает свежие посты, backfill идёт от самого старого из них
+            return {"channel": channel.username, "status": "waiting"}
+
+        def checkpoint(offset_id: int):
+            self.channel_repo.update_backfill_checkpoint(channel_id, offset_id)
+
+        async def backfill(parser_service: ParserService, access_hash: Optional[int]):
+            # После смены аккаунта продолжаем с последней контрольной точки
+            offset_id = channel.backfill_offset_id
+            if offset_id is None:
+                offset_id = self.post_repo.get_oldest_post_id(channel_id) or 0
+
+            return await parser_service.backfill(
+                channel_link=f"@{channel.username}",
+                channel_id=channel_id,
+                offset_id=offset_id,
+                access_hash=access_hash,
+                time_budget=time_budget,
+                on_checkpoint=checkpoint,
+            )
+
+        semaphores = {account: asyncio.Semaphore(1) for account in self.parser_services}
+        result = await self._run_with_failover(channel, semaphores, backfill)
+
+        if result["status"] == "completed":
+            self.channel_repo.update_backfill_checkpoint(
+                channel_id, result["offset_id"], completed_at=datetime.now(timezone.utc)
+            )
+        logger.info(
+            f"Backfill канала {channel.username}: сохранено {result['posts_saved']} постов, "
+            f"дошли до id {result['offset_id']} ({result['status']})"
+        )
+        return {"channel": channel.username, **result}
+
+    async def _run_with_failover(
+        self,
+        channel,
+        semaphores: Dict[str, asyncio.Semaphore],
+        call: Callable[[ParserService, Optional[int]], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """
+        Выполняет call(parser_service, access_hash) для канала на его основном аккаунте,
+        при RateLimitException переходит к следующему аккаунту кольца.
+        Если основной аккаунт канала резолвил его по username, сохраняет новый access_hash.
+        """
+        accounts = self.accounts_for(channel.channel_id)
+        for attempt, account in enumerate(accounts):
+            # access_hash действителен только для аккаунта, который его получил
+            access_hash = (
+                channel.access_hash if channel.access_hash_account == account else None
+            )
+            try:
+                async with semaphores[account]:
+                    result = await call(self.parser_services[account], access_hash)
+                break
+            except RateLimitException as e:
+                if attempt == len(accounts) - 1:
+                    raise
+                logger.warning(
+                    f"Аккаунт {account} ограничен ({e}), канал {channel.username} "
+                    f"переходит на аккаунт {accounts[attempt + 1]}"
+                )
+
+        result["account"] = account
+
+        # Сохраняем access_hash только основного аккаунта канала: хэш запасного
+        # аккаунта после failover заставил бы основной снова резолвить канал
+        owner = next(
+            (
+                a
+                for a in self.account_ring.accounts_for(channel.channel_id)
+                if a in self.parser_services
+            ),
+            account,
+        )
+        resolved_access_hash = result.pop("resolved_access_hash", None)
+        if resolved_access_hash and account == owner and (
+            resolved_access_hash != channel.access_hash
+            or account != channel.access_hash_account
+        ):
+            self.channel_repo.update_access_hash(
+                channel.channel_id, resolved_access_hash, account
+            )
+
+        return result
+
+    async def refresh_engagement(
+        self,
+        days: int = settings.ENGAGEMENT_REFRESH_DAYS,
+        max_concurrent: int = 5,  # на один аккаунт
+    ) -> Dict[str, Any]:
+        """
+        Обновляет просмотры и число комментариев постов за последние days дней.
+        Счётчики запрашиваются пачками через messages.getMessagesViews,
+        сами сообщения повторно не скачиваются.
+        """
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        post_ids = self.post_repo.get_recent_post_ids(since)
+        channels = [
+            c for c in self.channel_repo.get_all_channels()
+            if c.username and c.channel_id in post_ids
+        ]
+        logger.info(f"Обновление счётчиков: {len(channels)} каналов с постами за {days} дн.")
+
+        semaphores = {
+            account: asyncio.Semaphore(max_concurrent) for account in self.parser_services
+        }
+
+        async def refresh_one(channel):
+            async def refresh(parser_service: ParserService, access_hash: Optional[int]):
+                return await parser_service.refresh_engagement(
+                    channel_link=f"@{channel.username}",
+                    channel_id=channel.channel_id,
+                    post_ids=post_ids[channel.channel_id],
+                    access_hash=access_hash,
+                )
+
+            try:
+                return await self._run_with_failover(channel, semaphores, refresh)
+            except Exception as e:
+                logger.error(f"Ошибка обновления счётчиков канала {channel.username}: {e}")
+                return {"channel": channel.username, "error": str(e)}
+
+        results = await asyncio.gather(*(refresh_one(c) for c in channels))
+
+        summary = {
+            "channels_processed": len(channels),
+            "channels_with_errors": sum(1 for r in results if "error" in r),
+            "posts_checked": sum(r.get("posts_checked", 0) for r in results),
+            "posts_updated": sum(r.get("posts_updated", 0) for r in results),
+        }
+        logger.info(
+            f"Счётчики обновлены: проверено {summary['posts_checked']} постов, "
+            f"изменилось {summary['posts_updated']}"
+        )
+        return summary
+
     async def parse_channels(
         self, 
         limit: int,
-        delay: float = 0.1, 
-        max_concurrent: int = 5  # Максимум параллельных парсингов
+        max_concurrent: int = 5  # Максимум параллельных парсингов на один аккаунт
     ) -> Dict[str, Any]:
+        """
+        Парсит все каналы в одном event loop (для запуска вне Celery).
+        Цикл по расписанию раскладывает каналы по задачам parse_channel.
+        """
         channels = self.channel_repo.get_all_channels()
         logger.info(f"Начало парсинга {len(channels)} каналов")
 
         if not channels:
             logger.warning("Нет каналов для парсинга")
+            return build_parse_summary([], 0)
+
+        # Ограничиваем количество одновременных запросов на каждый аккаунт:
+        # аккаунты работают параллельно, пропускная способность растёт с их числом
+        semaphores = {
+            account: asyncio.Semaphore(max_concurrent) for account in self.parser_services
+        }
+        
+        # Запускаем парсинг всех каналов
+        tasks = [self._parse_one(c, limit, semaphores) for c in channels if c.username]
+        parsed_results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        return build_parse_summary(parsed_results, len(channels))
+
+    async def parse_channel(self, channel_id: int, limit: int) -> Dict[str, Any]:
+        """Парсинг одного канала по channel_id (задача parse_channel)"""
+        channel = self.channel_repo.get_channel(channel_id)
+        if channel is None:
+            logger.warning(f"Канал {channel_id} не найден, пропускаем")
             return {
-                "results": [], 
-                "total_parsed": 0, 
-                "total_saved": 0,
-                "channels_processed": 0
+                "channel": channel_id,
+                "error": "Channel not found",
+                "posts_parsed": 0,
+                "posts_saved": 0
+            }
+
+        semaphores = {account: asyncio.Semaphore(1) for account in self.parser_services}
+        return await self._parse_one(channel, limit, semaphores)
+
+    async def _parse_one(
+        self, channel, limit: int, semaphores: Dict[str, asyncio.Semaphore]
+    ) -> Dict[str, Any]:
+        """Парсинг одного канала"""
+        if not channel.username:
+            logger.warning(f"У канала {channel.title} нет username, пропускаем")
+            return {
+                "channel": channel.title,
+                "error": "No username",
+                "posts_parsed": 0,
+                "posts_saved": 0
             }
         
-        results = []
-        total_parsed = 0
-        total_saved = 0
-        channels_with_errors = 0
-
-        async def parse_one(channel):
-            """Парсинг одного канала"""
-            if not channel.username:
-                logger.warning(f"У канала {channel.title} нет username, пропускаем")
-                return {
-                    "channel": channel.title,
-                    "error": "No username",
-                    "posts_parsed": 0,
-                    "posts_saved": 0
-                }
-            
-            channel_link = f"@{channel.username}"
-            logger.info(f"Начинаем парсинг канала: {channel.username}")
-            
-            # Получаем последний сохраненный пост
-            last_post = self.post_repo.get_last_post(channel.channel_id)
-            last_post_id = last_post.post_id if last_post else None
-            
+        channel_link = f"@{channel.username}"
+        logger.info(f"Начинаем парсинг канала: {channel.username}")
+
+        async def parse(parser_service: ParserService, access_hash: Optional[int]):
+            # Курсор хранится в канале и сдвигается вместе со вставкой постов,
+            # поэтому после смены аккаунта уже записанное не скачивается повторно
+            last_post_id = channel.last_post_id
+
             logger.debug(f"Канал {channel.username}: last_post_id = {last_post_id}")
-            
-            try:
-                result = await self.parser_service.parse_and_save_posts(
-                    channel_link=channel_link,
-                    channel_id=channel.channel_id,
-                    last_post_id=last_post_id,  # передаем ID последнего сохраненного
-                    delay=delay,
-                    limit=limit,
-                )
 
-                # Обновляем время последнего парсинга
-                self.channel_repo.update_last_parsed(
-                    channel.channel_id, 
-                    datetime.now(timezone.utc)
-                )
+            return await parser_service.parse_and_save_posts(
+                channel_link=channel_link,
+                channel_id=channel.channel_id,
+                last_post_id=last_post_id,  # передаем ID последнего сохраненного
+                limit=limit,
+                access_hash=access_hash,
+            )
+
+        try:
+            result = await self._run_with_failover(channel, semaphores, parse)
 
-                # Если спарсили новые посты, обновляем last_post_id
-                if result["posts_saved"] > 0 and result.get("new_last_post_id"):
-                    # Здесь можно добавить обновление last_post_id в канале
-                    # если вы хотите хранить его там
-                    pass
-
-                # Логируем результат
-                status_msg = f"Канал {channel.username}: "
-                if result["posts_saved"] > 0:
-                    status_msg += f"{result['posts_saved']} новых постов сохранено"
-                else:
-                    status_msg += "нет новых постов"
-                
-                logger.info(status_msg)
-
-                return {
-                    "channel": channel.username,
-                    "channel_title": channel.title,
-                    **result
-                }
+            # Обновляем время последнего парсинга и назначаем следующий заход по активности канала
+            now = datetime.now(timezone.utc)
+            interval = self.scheduler.next_interval(
+                channel.parse_interval_seconds,
+                posts_in_window=self.post_repo.count_posts_since(
+                    channel.channel_id, self.scheduler.window_start(now)
+                ),
+                posts_saved=result["posts_saved"],
+                limit_reached=result["posts_parsed"] >= limit,
+            )
+            self.channel_repo.update_last_parsed(channel.channel_id, now, interval)
+            result["parse_interval_seconds"] = interval
+
+            # Логируем результат
+            status_msg = f"Канал {channel.username}: "
+            if result["posts_saved"] > 0:
+                status_msg += f"{result['posts_saved']} новых постов сохранено"
+            else:
+                status_msg += "нет новых постов"
             
-            except Exception as e:
-                logger.error(f"Ошибка парсинга канала {channel.username}: {str(e)}")
-                return {
-                    "channel": channel.username,
-                    "channel_title": channel.title,
-                    "error": str(e), 
-                    "posts_parsed": 0, 
-                    "posts_saved": 0
-                }
-
-        # Ограничиваем количество одновременных запросов
-        semaphore = asyncio.Semaphore(max_concurrent)
-        
-        async def parse_with_semaphore(channel):
-            async with semaphore:
-                return await parse_one(channel)
+            logger.info(status_msg)
+
+            return {
+                "channel": channel.username,
+                "channel_title": channel.title,
+                **result
+            }
         
-        # Запускаем парсинг всех каналов
-        tasks = [parse_with_semaphore(c) for c in channels if c.username]
-        parsed_results = await asyncio.gather(*tasks, return_exceptions=True)
+        except Exception as e:
+            logger.error(f"Ошибка парсинга канала {channel.username}: {str(e)}")
+            self.channel_repo.postpone_parse(
+                channel.channel_id,
+                datetime.now(timezone.utc)
+                + timedelta(seconds=self.scheduler.retry_interval(channel.parse_interval_seconds)),
+            )
+            return {
+                "channel": channel.username,
+                "channel_title": channel.title,
+                "error": str(e), 
+                "posts_parsed": 0, 
+                "posts_saved": 0
+            }
+
+
+def extract_username(channel_link: str) -> str:
+    """username канала из ссылки (@name, https://t.me/name или просто name)"""
+    channel_link = channel_link.strip()
+    if channel_link.startswith("@"):
+        return channel_link.lstrip("@")
+    if channel_link.startswith("https://t.me/"):
+        return channel_link.split("t.me/")[-1].split("?")[0].strip("/")
+    return channel_link
 
-        # Обрабатываем результаты
-        for r in parsed_results:
-            if isinstance(r, Exception):
-                logger.error(f"Исключение при парсинге: {r}")
-                channels_with_errors += 1
-                continue
-            
-            if "error" in r and r["error"] not in ["No username", "no_new_posts"]:
-                channels_with_errors += 1
-            
-            total_parsed += r.get("posts_parsed", 0)
-            total_saved += r.get("posts_saved", 0)
-            results.append(r)
 
-        # Итоговое логирование
-        successful_channels = len([r for r in results if r.get("posts_saved", 0) > 0])
+def build_parse_summary(
+    parsed_results: List[Any], channels_count: int
+) -> Dict[str, Any]:
+    """
+    Итог цикла парсинга по результатам отдельных каналов.
+    Используется и в parse_channels, и в колбэке chord задач parse_channel.
+    """
+    results = []
+    total_parsed = 0
+    total_saved = 0
+    channels_with_errors = 0
+    fetch_stats = FetchStats()
+
+    # Обрабатываем результаты
+    for r in parsed_results:
+        if isinstance(r, Exception):
+            logger.error(f"Исключение при парсинге: {r}")
+            channels_with_errors += 1
+            continue
         
-        logger.info(
-            f"Парсинг завершен:\n"
-            f"  - Всего каналов: {len(channels)}\n"
-            f"  - Успешно спарсено: {successful_channels}\n"
-            f"  - С ошибками: {channels_with_errors}\n"
-            f"  - Всего постов получено: {total_parsed}\n"
-            f"  - Новых постов сохранено: {total_saved}"
-        )
+        if "error" in r and r["error"] not in ["No username", "no_new_posts"]:
+            channels_with_errors += 1
         
-        return {
-            "results": results,
-            "total_parsed": total_parsed,
-            "total_saved": total_saved,
-            "channels_processed": len(channels),
-            "successful_channels": successful_channels,
-            "channels_with_errors": channels_with_errors,
-        }
\ No newline at end of file
+        total_parsed += r.get("posts_parsed", 0)
+        total_saved += r.get("posts_saved", 0)
+        if r.get("fetch_stats"):
+            fetch_stats.add(FetchStats(**r["fetch_stats"]))
+        results.append(r)
+
+    # Итоговое логирование
+    successful_channels = len([r for r in results if r.get("posts_saved", 0) > 0])
+    
+    logger.info(
+        f"Парсинг завершен:\n"
+        f"  - Всего каналов: {channels_count}\n"
+        f"  - Успешно спарсено: {successful_channels}\n"
+        f"  - С ошибками: {channels_with_errors}\n"
+        f"  - Сообщений скачано из Telegram: {fetch_stats.fetched}\n"
+        f"  - Из них оставлено: {fetch_stats.kept} "
+        f"(старых отброшено: {fetch_stats.skipped_old})\n"
+        f"  - Всего постов получено: {total_parsed}\n"
+        f"  - Новых постов сохранено: {total_saved}"
+    )
+    
+    return {
+        "results": results,
+        "total_parsed": total_parsed,
+        "total_saved": total_saved,
+        "fetch_stats": fetch_stats.as_dict(),
+        "channels_processed": channels_count,
+        "successful_channels": successful_channels,
+        "channels_with_errors": channels_with_errors,
+    }
@@ -1,21 +1,37 @@
 import pickle
+import threading
 from typing import Dict, List
 
+import numpy as np
+from scipy.special import expit
+
+from app.core.config import settings
+from app.ml.artifacts import MappedLinearModel, content_version, is_artifacts_dir
+
 
 class ClassificationService:
     """Сервис для классификации текстов"""
 
     def __init__(
         self,
-        model_path: str = "/home/saryglar311/Projects/DIPLOM/backend/app/ml/LR/logistic_regression_model_topics.pkl",
+        model_path: str = settings.TOPIC_MODEL_PATH,
     ):
         self.model = None
         self.vectorizer = None
         self.topics = None
         self.morph = None
         self.stopwords = None
-        self._load_model(model_path)
-        
+        self._coef = None
+        self._intercept = None
+        self._thresholds = None
+        self._labels = None
+
+        # Модель загружается лениво при первом предсказании (или в warm_up)
+        self.model_path = model_path
+        self._model_version = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
         self.topic_mapping = {
             'environment': 'environment',
             'manufacture': 'manufacture',
@@ -45,25 +61,50 @@ class ClassificationService:
             'demographic': 0.3
         }
 
+    @property
+    def model_version(self) -> str:
+        """Версия загруженной модели: считается по тем же байтам, из которых она загружена"""
+        self._ensure_loaded()
+        return self._model_version
+
+    def _ensure_loaded(self):
+        """Потокобезопасно загружает модель, если она ещё не загружена"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._load_model(self.model_path)
+            self._thresholds = np.array(
+                [self.topic_thresholds.get(topic, 0.3) for topic in self.topics]
+            )
+            self._labels = [self.topic_mapping.get(topic, topic) for topic in self.topics]
+            self._loaded = True
+
+    def warm_up(self) -> "ClassificationService":
+        """Заранее загружает модель в процессах, которые занимаются классификацией"""
+        self._ensure_loaded()
+        return self
+
     def _load_model(self, model_path: str):
-        """Загружает модель классификации"""
+        """Загружает модель классификации (.pkl или каталог memory-mapped артефактов)"""
         try:
+            if is_artifacts_dir(model_path):
+                self._load_artifacts(model_path)
+                return
+
+            # Файл читается один раз: версия и модель берутся из одних и тех же байтов
             with open(model_path, "rb") as f:
-                saved_data = pickle.load(f)
-                self.model = saved_data["model"]
-                self.vectorizer = saved_data["vectorizer"]
-                self.topics = saved_data["topics"]
-                
-                if "stopwords" in saved_data:
-                    self.stopwords = set(saved_data["stopwords"])
-                    print(f"Загружено {len(self.stopwords)} стоп-слов из модели")
-                else:
-                    import nltk
-                    nltk.download("stopwords", quiet=True)
-                    from nltk.corpus import stopwords
-                    self.stopwords = set(stopwords.words("russian"))
-                    print(f"Загружено {len(self.stopwords)} стандартных стоп-слов")
+                data = f.read()
+            saved_data = pickle.loads(data)
+            self.model = saved_data["model"]
+            self.vectorizer = saved_data["vectorizer"]
+            self.topics = saved_data["topics"]
+            self._load_stopwords(saved_data.get("stopwords"))
+            self._model_version = content_version(data)
             
+            self._stack_estimators()
+
             print(f"Модель загружена. Темы: {self.topics}")
             print(f"Размер словаря векторизатора: {len(self.vectorizer.vocabulary_)}")
             
@@ -71,6 +112,74 @@ class ClassificationService:
             print(f"Ошибка загрузки модели: {e}")
             raise
 
+    def _load_artifacts(self, directory: str):
+        """Загружает модель из каталога артефактов, общего для всех процессов"""
+        mapped = MappedLinearModel(directory)
+        self.model = None
+        self.vectorizer = mapped.vectorizer
+        self.topics = mapped.manifest["topics"]
+        self._coef = mapped.coef
+        self._intercept = mapped.intercept
+        self._load_stopwords(mapped.manifest.get("stopwords"))
+        self._model_version = mapped.version
+
+        print(f"Модель загружена из артефактов {directory}. Темы: {self.topics}")
+        print(f"Размер словаря векторизатора: {self.vectorizer.n_features}")
+
+    def _load_stopwords(self, saved_stopwords):
+        if saved_stopwords is not None:
+            self.stopwords = set(saved_stopwords)
+            print(f"Загружено {len(self.stopwords)} стоп-слов из модели")
+        else:
+            import nltk
+            nltk.download("stopwords", quiet=True)
+            from nltk.corpus import stopwords
+            self.stopwords = set(stopwords.words("russian"))
+            print(f"Загружено {len(self.stopwords)} стандартных стоп-слов")
+
+    def _stack_estimators(self):
+        """
+        Собирает коэффициенты one-vs-rest оценщиков в одну матрицу,
+        чтобы считать все темы одним умножением разреженной матрицы.
+        Если хотя бы один оценщик не является бинарной логистической
+        регрессией, остаётся поштучный predict_proba.
+        """
+        from sklearn.linear_model import LogisticRegression
+
+        coefs, intercepts = [], []
+        for estimator in self.model.estimators_:
+            if (
+                not isinstance(estimator, LogisticRegression)
+                or getattr(estimator, "multi_class", "auto") == "multinomial"
+                or len(estimator.classes_) != 2
+            ):
+                self._coef = None
+                self._intercept = None
+                return
+            coefs.append(estimator.coef_[0])
+            intercepts.append(estimator.intercept_[0])
+
+        self._coef = np.ascontiguousarray(np.vstack(coefs).T)
+        self._intercept = np.asarray(intercepts)
+
+    def _predict_proba_matrix(self, texts: List[str]) -> np.ndarray:
+        """Вероятности всех тем для пачки предобработанных текстов: (n_texts, n_topics)"""
+        return self._proba_from_features(self.vectorizer.transform(texts))
+
+    def _proba_from_features(self, features) -> np.ndarray:
+        """Вероятности всех тем по матрице TF-IDF признаков"""
+        if self._coef is not None:
+            return expit(features @ self._coef + self._intercept)
+
+        return np.column_stack(
+            [estimator.predict_proba(features)[:, 1] for estimator in self.model.estimators_]
+        )
+
+    def vectorize(self, texts: List[str]):
+        """TF-IDF признаки текстов: по строке на каждый текст, включая пустые"""
+        self._ensure_loaded()
+        return self.vectorizer.transform([self.preprocess_text_simple(t) for t in texts])
+
     def preprocess_text_simple(self, text: str) -> str:
         """
         Упрощённая предобработка текста
@@ -88,38 +197,52 @@ class ClassificationService:
 
     def predict_topics(self, text: str) -> List[str]:
         """Предсказывает темы для текста (с порогами как при обучении)"""
-        if not text or not text.strip():
-            return ['unclassified']
+        return self.predict_topics_batch([text])[0]
+
+    def predict_topics_batch(self, texts: List[str]) -> List[List[str]]:
+        """Предсказывает темы для пачки текстов за один проход векторизатора"""
+        self._ensure_loaded()
+
+        processed = [self.preprocess_text_simple(text) for text in texts]
+        positions = [i for i, text in enumerate(processed) if text]
 
         try:
-            processed_text = self.preprocess_text_simple(text)
-            
-            if not processed_text:
-                return ['unclassified']
-            
-            text_vec = self.vectorizer.transform([processed_text])
-            
-            predicted_topics = []
-            
-            for i, (topic, estimator) in enumerate(zip(self.topics, self.model.estimators_)):
-                prob = estimator.predict_proba(text_vec)[0, 1]
-                
-                threshold = self.topic_thresholds.get(topic, 0.3)
-                
-                if prob > threshold:
-                    if topic in self.topic_mapping:
-                        predicted_topics.append(self.topic_mapping[topic])
-                    else:
-                        predicted_topics.append(topic)
-            
-            if not predicted_topics:
-                return ['unclassified']
-            
-            return predicted_topics
+            features = (
+                self.vectorizer.transform([processed[i] for i in positions])
+                if positions
+                else None
+            )
+            return self._topics_from_features(features, positions, len(texts))
+
+        except Exception as e:
+            print(f"Ошибка при предсказании тем: {e}")
+            return [['unclassified'] for _ in texts]
+
+    def predict_topics_from_features(self, features, texts: List[str]) -> List[List[str]]:
+        """Темы по уже посчитанным признакам (строки features соответствуют texts)"""
+        self._ensure_loaded()
+        positions = [i for i, text in enumerate(texts) if text and text.strip()]
+
+        try:
+            return self._topics_from_features(features[positions], positions, len(texts))
 
         except Exception as e:
             print(f"Ошибка при предсказании тем: {e}")
-            return ['unclassified']
+            return [['unclassified'] for _ in texts]
+
+    def _topics_from_features(self, features, positions: List[int], n_texts: int) -> List[List[str]]:
+        result = [['unclassified'] for _ in range(n_texts)]
+        if not positions:
+            return result
+
+        mask = self._proba_from_features(features) > self._thresholds
+
+        for row, i in enumerate(positions):
+            topic_indices = np.flatnonzero(mask[row])
+            if topic_indices.size:
+                result[i] = [self._labels[j] for j in topic_indices]
+
+        return result
 
     def predict_topics_with_probs(self, text: str) -> Dict:
         """Предсказывает темы с вероятностями"""
@@ -138,24 +261,18 @@ class ClassificationService:
             if not processed_text:
                 return result
             
-            text_vec = self.vectorizer.transform([processed_text])
-            
-            probabilities = []
-            
-            for i, (topic, estimator) in enumerate(zip(self.topics, self.model.estimators_)):
-                prob = estimator.predict_proba(text_vec)[0, 1]
+            self._ensure_loaded()
+            probabilities = self._predict_proba_matrix([processed_text])[0]
+
+            for topic, label, prob, threshold in zip(
+                self.topics, self._labels, probabilities, self._thresholds
+            ):
                 result["probabilities"][topic] = float(prob)
-                probabilities.append(prob)
-                
-                threshold = self.topic_thresholds.get(topic, 0.3)
                 if prob > threshold:
-                    if topic in self.topic_mapping:
-                        result["topics"].append(self.topic_mapping[topic])
-                    else:
-                        result["topics"].append(topic)
+                    result["topics"].append(label)
             
-            if probabilities:
-                result["confidence"] = sum(probabilities) / len(probabilities)
+            if probabilities.size:
+                result["confidence"] = float(probabilities.mean())
 
             return result
 
@@ -0,0 +1,176 @@
+"""
+Поиск почти-дубликатов постов (кросс-посты одной новости с мелкими правками).
+
+Для очищенного текста считается 64-битный SimHash по словным триграммам.
+Посты считаются дубликатами, если расстояние Хэмминга между отпечатками
+не больше max_distance. Отпечаток делится на 4 полосы по 16 бит: при
+max_distance < 4 у дубликатов совпадает хотя бы одна полоса, поэтому
+кандидатов достаточно искать по точному совпадению полос.
+
+Полосы хранятся в Redis в сортированных множествах (оценка — время
+добавления), так что индекс общий для всех воркеров и ограничен окном
+window_days. Проверка пачки постов — один pipeline-запрос в Redis.
+"""
+import hashlib
+import logging
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_BAND_KEY = "dedup:band:{band}:{value:04x}"
+
+SIMHASH_BITS = 64
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+UINT64_MASK = (1 << SIMHASH_BITS) - 1
+
+SHINGLE_SIZE = 3
+MIN_TOKENS = 5  # короткие тексты слишком похожи друг на друга, их не сравниваем
+
+_TOKEN_RE = re.compile(r"\w+")
+_BIT_SHIFTS = np.arange(SIMHASH_BITS, dtype=np.uint64)
+
+
+def simhash(text: str) -> Optional[int]:
+    """
+    SimHash очищенного текста как знаковое 64-битное число (под BIGINT в Postgres).
+    Для пустых и слишком коротких текстов возвращает None.
+    """
+    tokens = _TOKEN_RE.findall(text.lower()) if text else []
+    if len(tokens) < MIN_TOKENS:
+        return None
+
+    shingles = {
+        " ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)
+    }
+    hashes = np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+            for s in shingles
+        ),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+
+    votes = ((hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)).sum(axis=0) * 2 > len(shingles)
+    value = int((votes.astype(np.uint64) << _BIT_SHIFTS).sum())
+
+    return value - (1 << SIMHASH_BITS) if value >> (SIMHASH_BITS - 1) else value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return ((a ^ b) & UINT64_MASK).bit_count()
+
+
+def _bands(value: int) -> List[int]:
+    value &= UINT64_MASK
+    return [(value >> (band * BAND_BITS)) & BAND_MASK for band in range(BANDS)]
+
+
+class DuplicateIndex:
+    """LSH-индекс SimHash-отпечатков постов в Redis"""
+
+    def __init__(
+        self,
+        max_distance: int = settings.DEDUP_MAX_DISTANCE,
+        window_days: int = settings.DEDUP_WINDOW_DAYS,
+    ):
+        if max_distance >= BANDS:
+            raise ValueError(f"max_distance должен быть меньше числа полос ({BANDS})")
+        self.max_distance = max_distance
+        self.window = window_days * 24 * 3600
+
+    def find_canonical(self, posts: Sequence[Tuple[int, Optional[int]]]) -> Dict[int, int]:
+        """
+        Для пачки (id поста, simhash) в порядке вставки возвращает
+        {id дубликата: id канонического поста}. Дубликаты внутри пачки
+        ссылаются на первый пост группы. Индекс не меняется — после фиксации
+        транзакции канонические посты добавляются через add().
+        """
+        hashed = [(post_id, value) for post_id, value in posts if value is not None]
+        if not hashed:
+            return {}
+
+        candidates = self._lookup([value for _, value in hashed])
+
+        links: Dict[int, int] = {}
+        batch_bands: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+
+        for (post_id, value), indexed in zip(hashed, candidates):
+            bands = _bands(value)
+            for band, band_value in enumerate(bands):
+                indexed.extend(batch_bands.get((band, band_value), ()))
+
+            best = None
+            for candidate_id, candidate_value in indexed:
+                distance = hamming_distance(value, candidate_value)
+                if distance <= self.max_distance and (
+                    best is None or (distance, candidate_id) < best
+                ):
+                    best = (distance, candidate_id)
+
+            if best is not None:
+                links[post_id] = best[1]
+                continue
+
+            for band, band_value in enumerate(bands):
+                batch_bands.setdefault((band, band_value), []).append((post_id, value))
+
+        return links
+
+    def add(self, posts: Iterable[Tuple[int, Optional[int]]]):
+        """Добавляет канонические посты в индекс и удаляет записи старше окна"""
+        now = time.time()
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            keys = set()
+            for post_id, value in posts:
+                if value is None:
+                    continue
+                for band, band_value in enumerate(_bands(value)):
+                    key = REDIS_BAND_KEY.format(band=band, value=band_value)
+                    pipe.zadd(key, {f"{post_id}:{value}": now})
+                    keys.add(key)
+            for key in keys:
+                pipe.zremrangebyscore(key, "-inf", now - self.window)
+                pipe.expire(key, self.window)
+            if keys:
+                pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Не удалось обновить индекс дубликатов: {e}")
+
+    def _lookup(self, values: List[int]) -> List[List[Tuple[int, int]]]:
+        """Кандидаты из Redis для каждого отпечатка: посты с совпадающей полосой"""
+        candidates: List[List[Tuple[int, int]]] = [[] for _ in values]
+        min_score = time.time() - self.window
+
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for value in values:
+                for band, band_value in enumerate(_bands(value)):
+                    pipe.zrangebyscore(
+                        REDIS_BAND_KEY.format(band=band, value=band_value), min_score, "+inf"
+                    )
+            responses = pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Индекс дубликатов недоступен: {e}")
+            return candidates
+
+        for position, members in enumerate(responses):
+            for member in members:
+                post_id, value = member.decode().split(":")
+                candidates[position // BANDS].append((int(post_id), int(value)))
+
+        return candidates
+
+
+duplicate_index = DuplicateIndex()
@@ -0,0 +1,196 @@
+import logging
+import os
+import threading
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.ml.artifacts import MANIFEST_FILE, is_artifacts_dir
+from app.services.binary_classif_service import (
+    BinaryClassificationService,
+    binary_classification_service,
+)
+from app.services.classification_service import (
+    ClassificationService,
+    classification_service,
+)
+
+logger = logging.getLogger(__name__)
+
+RELOAD_CHANNEL = "ml:models:reload"
+
+# Небольшой набор текстов для проверки новой модели перед подменой
+CANARY_TEXTS = [
+    "",
+    "В Кызыле отключили отопление в нескольких домах, жители жалуются",
+    "На дороге Кызыл — Абакан произошло ДТП, пострадали два человека",
+    "В школах республики начались выпускные экзамены",
+    "Цены на продукты в магазинах выросли за последний месяц",
+    "Больница не может принять пациентов из-за нехватки врачей",
+    "Глава республики провёл совещание по вопросам занятости",
+]
+
+
+class ModelSet(NamedTuple):
+    """Согласованная пара моделей: пачка целиком считается одной и той же парой"""
+
+    topic_service: ClassificationService
+    problem_service: BinaryClassificationService
+
+    @property
+    def version(self) -> str:
+        return f"{self.topic_service.model_version}:{self.problem_service.model_version}"
+
+
+class ModelRegistry:
+    """
+    Держит активную пару моделей и подменяет её без перезапуска процесса.
+
+    Новая версия загружается в фоне (по изменению файлов моделей или по сообщению
+    в Redis-канале ml:models:reload), проверяется на канареечных текстах и
+    атомарно подменяет ссылку. Пачки, уже получившие active(), досчитываются
+    старой моделью.
+    """
+
+    def __init__(self, initial: ModelSet):
+        self._active = initial
+        self._swap_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._watching = False
+        self._stop_watching = threading.Event()
+
+    def active(self) -> ModelSet:
+        return self._active
+
+    def warm_up(self) -> ModelSet:
+        models = self._active
+        models.topic_service.warm_up()
+        models.problem_service.warm_up()
+        return models
+
+    def reload(self) -> bool:
+        """
+        Загружает и проверяет новые модели, затем подменяет активные.
+        Модели всегда читаются с настроенных путей (TOPIC_MODEL_PATH, PROBLEM_MODEL_PATH):
+        так перезапущенные и новые процессы воркеров загружают ту же версию.
+        Параллельные запросы на перезагрузку схлопываются в один.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            logger.info("Перезагрузка моделей уже выполняется, запрос пропущен")
+            return False
+
+        try:
+            current = self._active
+            candidate = ModelSet(
+                ClassificationService(current.topic_service.model_path),
+                BinaryClassificationService(current.problem_service.model_path),
+            )
+            if candidate.version == current.version:
+                logger.info(f"Версия моделей не изменилась ({current.version})")
+                return False
+
+            candidate.topic_service.warm_up()
+            candidate.problem_service.warm_up()
+            self._validate(candidate)
+
+            with self._swap_lock:
+                self._active = candidate
+            logger.info(f"Модели обновлены: {current.version} -> {candidate.version}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Новая версия моделей отклонена: {e}")
+            return False
+        finally:
+            self._reload_lock.release()
+
+    @staticmethod
+    def _validate(models: ModelSet, texts: List[str] = CANARY_TEXTS):
+        topics = models.topic_service.predict_topics_batch(texts)
+        if len(topics) != len(texts) or not all(topics):
+            raise ValueError("модель тем вернула некорректный результат на канареечном наборе")
+
+        problems = models.problem_service.predict_batch(texts)
+        probability = problems.probability
+        if (
+            len(probability) != len(texts)
+            or not np.all(np.isfinite(probability))
+            or probability.min() < 0.0
+            or probability.max() > 1.0
+        ):
+            raise ValueError("модель проблемности вернула некорректные вероятности")
+
+    def start_watching(self, poll_interval: float = settings.ML_RELOAD_POLL_INTERVAL):
+        """Запускает фоновые потоки: опрос файлов моделей и подписку на Redis"""
+        if self._watching:
+            return
+        self._watching = True
+        self._stop_watching.clear()
+
+        threading.Thread(
+            target=self._poll_files, args=(poll_interval,), name="model-file-watcher", daemon=True
+        ).start()
+        threading.Thread(
+            target=self._listen_redis, name="model-reload-listener", daemon=True
+        ).start()
+
+    def stop_watching(self):
+        """Останавливает фоновые потоки (при завершении процесса)"""
+        self._stop_watching.set()
+        self._watching = False
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[float]:
+        if is_artifacts_dir(path):
+            path = os.path.join(path, MANIFEST_FILE)
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def _poll_files(self, poll_interval: float):
+        models = self._active
+        seen = (
+            self._mtime(models.topic_service.model_path),
+            self._mtime(models.problem_service.model_path),
+        )
+        while not self._stop_watching.wait(poll_interval):
+            models = self._active
+            current = (
+                self._mtime(models.topic_service.model_path),
+                self._mtime(models.problem_service.model_path),
+            )
+            if current != seen and None not in current:
+                seen = current
+                self.reload()
+
+    def _listen_redis(self):
+        while not self._stop_watching.is_set():
+            pubsub = None
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(RELOAD_CHANNEL)
+                # get_message с таймаутом, а не listen(): поток замечает stop_watching
+                while not self._stop_watching.is_set():
+                    # Содержимое сообщения не важно: пути моделей берутся из настроек
+                    if pubsub.get_message(timeout=1.0) is not None:
+                        self.reload()
+            except redis.RedisError as e:
+                logger.warning(f"Подписка на перезагрузку моделей прервана: {e}")
+                self._stop_watching.wait(5)
+            finally:
+                if pubsub is not None:
+                    pubsub.close()
+
+
+def request_reload() -> int:
+    """Публикует команду перезагрузки моделей для всех процессов; возвращает число подписчиков"""
+    return get_redis().publish(RELOAD_CHANNEL, "reload")
+
+
+model_registry = ModelRegistry(
+    ModelSet(classification_service, binary_classification_service)
+)
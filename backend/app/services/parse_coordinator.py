@@ -0,0 +1,156 @@
+"""
+Защита цикла парсинга от наложений в кластере воркеров.
+
+- Цикл (парсинг всех каналов) держит блокировку parse:cycle:lock, её
+  значение — id цикла. Повторный запуск, пока цикл идёт, не ставит новых
+  задач, а возвращает текущий цикл. Аренду цикла продлевают задачи его
+  каналов (heartbeat и завершение каждого канала) и, пока задачи ждут в очереди,
+  задача heartbeat_parse_cycle; снимает — колбэк chord.
+- Каждый канал парсится под своей блокировкой parse:channel:{id}:lock,
+  поэтому плановый тик и внеплановый цикл не скачивают канал дважды.
+- Прогресс цикла хранится в hash parse:cycle:{id} и отдаётся в GET /parse/status.
+"""
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.dependencies.lease_lock import LeaseLock
+
+logger = logging.getLogger(__name__)
+
+CYCLE_LOCK_KEY = "parse:cycle:lock"
+CYCLE_STATE_KEY = "parse:cycle:{cycle_id}"
+LAST_CYCLE_KEY = "parse:cycle:last"
+CHANNEL_LOCK_KEY = "parse:channel:{channel_id}:lock"
+CHANNEL_LOCK_PATTERN = "parse:channel:*:lock"
+BACKFILL_LOCK_KEY = "backfill:channel:{channel_id}:lock"
+
+CYCLE_STATE_TTL = 24 * 3600
+
+
+class ParseCoordinator:
+    def __init__(
+        self,
+        cycle_lease: float = settings.PARSE_CYCLE_LEASE,
+        channel_lease: float = settings.PARSE_CHANNEL_LEASE,
+        redis_client: Optional[redis.Redis] = None,
+    ):
+        self.cycle_lease = cycle_lease
+        self.channel_lease = channel_lease
+        self._redis_client = redis_client
+
+    @property
+    def redis(self) -> redis.Redis:
+        return self._redis_client or get_redis()
+
+    def _cycle_lock(self, cycle_id: Optional[str] = None) -> LeaseLock:
+        return LeaseLock(CYCLE_LOCK_KEY, self.cycle_lease, token=cycle_id, redis_client=self.redis)
+
+    def channel_lock(self, channel_id: int) -> LeaseLock:
+        return LeaseLock(
+            CHANNEL_LOCK_KEY.format(channel_id=channel_id),
+            self.channel_lease,
+            redis_client=self.redis,
+        )
+
+    def backfill_lock(self, channel_id: int) -> LeaseLock:
+        """Backfill канала идёт в одной задаче; с инкрементальным парсингом он не пересекается"""
+        return LeaseLock(
+            BACKFILL_LOCK_KEY.format(channel_id=channel_id),
+            self.channel_lease,
+            redis_client=self.redis,
+        )
+
+    def current_cycle(self) -> Optional[str]:
+        return self._cycle_lock().owner()
+
+    def start_cycle(self, trigger: str) -> Optional[str]:
+        """Начинает цикл; None — уже идёт другой цикл (запуск сливается с ним)"""
+        cycle_id = uuid.uuid4().hex
+        if not self._cycle_lock(cycle_id).acquire():
+            return None
+
+        state_key = CYCLE_STATE_KEY.format(cycle_id=cycle_id)
+        pipe = self.redis.pipeline()
+        pipe.hset(
+            state_key,
+            mapping={
+                "trigger": trigger,
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "channels_total": 0,
+                "channels_done": 0,
+                "channels_failed": 0,
+            },
+        )
+        pipe.expire(state_key, CYCLE_STATE_TTL)
+        pipe.set(LAST_CYCLE_KEY, cycle_id)
+        pipe.execute()
+        return cycle_id
+
+    def set_total(self, cycle_id: str, channels_total: int):
+        self.redis.hset(CYCLE_STATE_KEY.format(cycle_id=cycle_id), "channels_total", channels_total)
+
+    def heartbeat(self, cycle_id: Optional[str]) -> bool:
+        """Продлевает аренду цикла; False — цикл уже завершён или аренда истекла"""
+        if cycle_id is None:
+            return False
+        return self._cycle_lock(cycle_id).extend()
+
+    def channel_done(self, cycle_id: Optional[str], failed: bool = False):
+        if cycle_id is None:
+            return
+        state_key = CYCLE_STATE_KEY.format(cycle_id=cycle_id)
+        pipe = self.redis.pipeline()
+        pipe.hincrby(state_key, "channels_done", 1)
+        if failed:
+            pipe.hincrby(state_key, "channels_failed", 1)
+        pipe.execute()
+        self.heartbeat(cycle_id)
+
+    def finish_cycle(self, cycle_id: str, status: str = "completed"):
+        self.redis.hset(
+            CYCLE_STATE_KEY.format(cycle_id=cycle_id),
+            mapping={"status": status, "finished_at": datetime.now(timezone.utc).isoformat()},
+        )
+        if not self._cycle_lock(cycle_id).release():
+            logger.warning(f"Цикл парсинга {cycle_id} завершён после истечения аренды")
+
+    def cycle_state(self, cycle_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.redis.hgetall(CYCLE_STATE_KEY.format(cycle_id=cycle_id))
+        if not raw:
+            return None
+        state = {key.decode(): value.decode() for key, value in raw.items()}
+        for field in ("channels_total", "channels_done", "channels_failed"):
+            state[field] = int(state.get(field, 0))
+        state["channels_remaining"] = max(state["channels_total"] - state["channels_done"], 0)
+        state["cycle_id"] = cycle_id
+        return state
+
+    def status(self) -> Dict[str, Any]:
+        """Текущий (или последний) цикл и каналы, которые парсятся прямо сейчас"""
+        running = self.current_cycle()
+        last = self.redis.get(LAST_CYCLE_KEY)
+        cycle_id = running or (last.decode() if last is not None else None)
+
+        channels_in_progress = sorted(
+            int(key.decode().split(":")[2])
+            for key in self.redis.scan_iter(match=CHANNEL_LOCK_PATTERN, count=500)
+        )
+        cycle = self.cycle_state(cycle_id) if cycle_id else None
+        if cycle is not None:
+            # Цикл без отметки о завершении и без блокировки — аренда истекла (воркеры упали)
+            cycle.setdefault("status", "running" if running else "expired")
+
+        return {
+            "running": running is not None,
+            "cycle": cycle,
+            "channels_in_progress": channels_in_progress,
+        }
+
+
+parse_coordinator = ParseCoordinator()
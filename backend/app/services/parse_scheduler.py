@@ -0,0 +1,65 @@
+"""
+Расписание парсинга каналов с учётом их активности.
+
+Интервал канала подбирается так, чтобы за один заход приходило около
+target_new_posts новых постов: по числу постов за последние window_days
+дней (posts.date). Если заход ничего не принёс, интервал растёт в
+empty_backoff раз; если упёрлись в limit, канал отстаёт и следующий заход
+назначается через min_interval. Интервал ограничен [min_interval, max_interval].
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.core.config import settings
+
+
+class ParseScheduler:
+    def __init__(
+        self,
+        min_interval: int = settings.PARSE_MIN_INTERVAL,
+        max_interval: int = settings.PARSE_MAX_INTERVAL,
+        default_interval: int = settings.PARSE_DEFAULT_INTERVAL,
+        window_days: int = settings.PARSE_RATE_WINDOW_DAYS,
+        target_new_posts: float = settings.PARSE_TARGET_NEW_POSTS,
+        empty_backoff: float = settings.PARSE_EMPTY_BACKOFF,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval
+        self.window = timedelta(days=window_days)
+        self.target_new_posts = target_new_posts
+        self.empty_backoff = empty_backoff
+
+    def window_start(self, now: datetime) -> datetime:
+        """Начало окна, по которому считается частота постов"""
+        return now - self.window
+
+    def next_interval(
+        self,
+        previous: Optional[int],
+        posts_in_window: int,
+        posts_saved: int,
+        limit_reached: bool = False,
+    ) -> int:
+        """Интервал до следующего захода в канал, секунд"""
+        if limit_reached:
+            return self.min_interval
+
+        previous = previous or self.default_interval
+        if posts_in_window:
+            posts_per_second = posts_in_window / self.window.total_seconds()
+            interval = self.target_new_posts / posts_per_second
+        else:
+            interval = self.max_interval
+
+        if not posts_saved:
+            interval = max(interval, previous * self.empty_backoff)
+
+        return int(min(max(interval, self.min_interval), self.max_interval))
+
+    def retry_interval(self, previous: Optional[int]) -> int:
+        """Интервал после ошибки парсинга: расписание канала не меняется"""
+        return previous or self.default_interval
+
+
+parse_scheduler = ParseScheduler()
@@ -1,15 +1,40 @@
-from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from app.custom_classes.telegram_parser import TelegramParser
+from app.custom_classes.telegram_parser import FetchStats, TelegramParser
 from app.repositories.post import PostRepository
 from app.schemas.post import PostCreate
-from app.dependencies.text_cleaner import clean_telegram_post
+from app.core.config import settings
+from app.dependencies.text_cleaner import telegram_post_cleaner
+from app.exceptions.custom_exceptions import StaleEntityException
+from app.services.dedup_service import DuplicateIndex, duplicate_index, simhash
+from app.tasks.classification import classify_posts_task
+
+logger = logging.getLogger(__name__)
+
+_clean_executor = ThreadPoolExecutor(
+    max_workers=settings.INGEST_CLEAN_WORKERS, thread_name_prefix="post-cleaner"
+)
+
 
 class ParserService:
 
-    def __init__(self, parser: TelegramParser, post_repo: PostRepository):
+    def __init__(
+        self,
+        parser: TelegramParser,
+        post_repo: PostRepository,
+        dedup_index: Optional[DuplicateIndex] = duplicate_index if settings.DEDUP_ENABLED else None,
+        queue_size: int = settings.INGEST_QUEUE_SIZE,
+        write_chunk_size: int = settings.INGEST_WRITE_CHUNK_SIZE,
+    ):
         self.parser = parser
         self.post_repo = post_repo
+        self.dedup_index = dedup_index
+        self.queue_size = queue_size
+        self.write_chunk_size = write_chunk_size
 
     async def parse_and_save_posts(
         self,
@@ -17,47 +42,270 @@ class ParserService:
         channel_id: int,
         limit: int,
         last_post_id: Optional[int] = None,
-        delay: float = 0.1,
+        access_hash: Optional[int] = None,
     ) -> Dict[str, Any]:
+        """
+        Парсит новые посты канала. Если известен access_hash, канал адресуется
+        напрямую через InputPeerChannel, без get_entity (resolve по username).
+        Если access_hash устарел, канал резолвится заново, а новый access_hash
+        возвращается в поле resolved_access_hash.
+        """
+        if access_hash is not None:
+            entity = self.parser.input_peer(channel_id, access_hash)
+            try:
+                return await self._ingest(entity, channel_id, limit, last_post_id)
+            except StaleEntityException as e:
+                logger.warning(f"access_hash канала {channel_link} устарел, резолвим заново: {e}")
 
         info = await self.parser.get_channel_info(channel_link)
-        entity = info["entity"]
+        result = await self._ingest(info["entity"], channel_id, limit, last_post_id)
+        result["resolved_access_hash"] = info["access_hash"]
+        return result
 
-        posts_data = await self.parser.parse_posts(
-            entity, delay=delay, last_post_id=last_post_id, limit=limit
-        )
+    async def refresh_engagement(
+        self,
+        channel_link: str,
+        channel_id: int,
+        post_ids: List[int],
+        access_hash: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Обновляет просмотры и комментарии уже сохранённых постов канала.
+        Канал адресуется так же, как в parse_and_save_posts.
+        """
+        if access_hash is not None:
+            entity = self.parser.input_peer(channel_id, access_hash)
+            try:
+                return await self._refresh_engagement(entity, channel_id, post_ids)
+            except StaleEntityException as e:
+                logger.warning(f"access_hash канала {channel_link} устарел, резолвим заново: {e}")
 
-        if not posts_data:
-            return {
-                "posts_parsed": 0,
-                "posts_saved": 0,
-                "status": "no_new_posts",
-                "last_post_date": None,
-                "new_last_post_id": last_post_id,
-            }
-
-        valid_posts: List[PostCreate] = []
-        for post in posts_data:
-            if last_post_id and post["post_id"] <= last_post_id:
-                continue
-
-            raw_text = post.get("message") or ""
-            cleaned_text = clean_telegram_post(raw_text)
-            post["message"] = cleaned_text
+        info = await self.parser.get_channel_info(channel_link)
+        result = await self._refresh_engagement(info["entity"], channel_id, post_ids)
+        result["resolved_access_hash"] = info["access_hash"]
+        return result
 
-            post["channel_id"] = channel_id
-            valid_posts.append(PostCreate(**post))
+    async def _refresh_engagement(
+        self, entity, channel_id: int, post_ids: List[int]
+    ) -> Dict[str, Any]:
+        checked = 0
+        updated = 0
+        async for rows in self.parser.iter_engagement(entity, post_ids):
+            checked += len(rows)
+            updated += self.post_repo.bulk_update_engagement(channel_id, rows)
+        return {"posts_checked": checked, "posts_updated": updated}
 
-        inserted = self.post_repo.bulk_create(valid_posts)
+    async def _ingest(
+        self,
+        entity,
+        channel_id: int,
+        limit: int,
+        last_post_id: Optional[int],
+    ) -> Dict[str, Any]:
+        """
+        Потоковый парсинг канала: страницы из Telegram -> очистка в пуле потоков ->
+        запись в БД пачками по write_chunk_size. Очередь между стадиями ограничена
+        queue_size страницами, поэтому память не растёт с глубиной истории,
+        а первые посты попадают в БД после первой пачки.
+        Классификация — отдельная стадия (задача classify_posts), она запускается
+        после каждой записанной пачки.
+        """
+        stats = FetchStats()
+        loop = asyncio.get_running_loop()
+        # Futures очистки страниц в порядке получения: порядок записи сохраняется
+        pages: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
 
-        new_last_post_id = (
-            max(p["post_id"] for p in posts_data) if posts_data else last_post_id
-        )
+        async def fetch():
+            try:
+                async for page in self.parser.iter_pages(
+                    entity, limit=limit, last_post_id=last_post_id, stats=stats
+                ):
+                    await pages.put(
+                        loop.run_in_executor(_clean_executor, self._prepare_posts, page, channel_id)
+                    )
+            except Exception as e:
+                await pages.put(e)
+            else:
+                await pages.put(None)
+
+        parsed = 0
+        inserted = 0
+        duplicates = 0
+        last_post_date = None
+        new_last_post_id = last_post_id
+        buffer: List[PostCreate] = []
+        failure: Optional[Exception] = None
+
+        def write(chunk: List[PostCreate]):
+            nonlocal inserted, duplicates
+            chunk_inserted, chunk_duplicates = self._save_and_classify(chunk)
+            inserted += chunk_inserted
+            duplicates += chunk_duplicates
+
+        producer = asyncio.create_task(fetch())
+        try:
+            while True:
+                item = await pages.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    failure = item
+                    break
+
+                posts = await item
+                parsed += len(posts)
+                # Страницы нового канала идут от новых к старым, поэтому берём максимум
+                newest = max(posts, key=lambda post: post.post_id)
+                if newest.post_id > (new_last_post_id or 0):
+                    new_last_post_id = newest.post_id
+                    last_post_date = newest.date
+                buffer.extend(posts)
+
+                while len(buffer) >= self.write_chunk_size:
+                    write(buffer[:self.write_chunk_size])
+                    buffer = buffer[self.write_chunk_size:]
+
+            # Уже скачанное сохраняем даже при ошибке: следующий цикл продолжит с места остановки
+            if buffer:
+                write(buffer)
+        finally:
+            if not producer.done():
+                producer.cancel()
+
+        if failure is not None:
+            raise failure
+
+        # Курсор сдвигается до самого нового полученного сообщения, а не только сохранённого:
+        # иначе сообщения без текста в конце канала скачивались бы заново каждый цикл
+        if stats.max_id > (new_last_post_id or 0):
+            self.post_repo.advance_channel_cursor(channel_id, stats.max_id)
+            new_last_post_id = stats.max_id
 
         return {
-            "posts_parsed": len(posts_data),
+            "posts_parsed": parsed,
+            "fetch_stats": stats.as_dict(),
             "posts_saved": inserted,
+            "duplicates": duplicates,
             "status": "completed" if inserted else "no_new_posts",
-            "last_post_date": valid_posts[-1].date if valid_posts else None,
+            "last_post_date": last_post_date,
             "new_last_post_id": new_last_post_id,
         }
+
+    async def backfill(
+        self,
+        channel_link: str,
+        channel_id: int,
+        offset_id: int,
+        access_hash: Optional[int] = None,
+        time_budget: float = settings.BACKFILL_TIME_BUDGET,
+        on_checkpoint: Optional[Callable[[int], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Догружает историю канала назад от offset_id (0 — с самого нового сообщения).
+        Канал адресуется так же, как в parse_and_save_posts.
+        """
+        if access_hash is not None:
+            entity = self.parser.input_peer(channel_id, access_hash)
+            try:
+                return await self._backfill(
+                    entity, channel_id, offset_id, time_budget, on_checkpoint
+                )
+            except StaleEntityException as e:
+                logger.warning(f"access_hash канала {channel_link} устарел, резолвим заново: {e}")
+
+        info = await self.parser.get_channel_info(channel_link)
+        result = await self._backfill(
+            info["entity"], channel_id, offset_id, time_budget, on_checkpoint
+        )
+        result["resolved_access_hash"] = info["access_hash"]
+        return result
+
+    async def _backfill(
+        self,
+        entity,
+        channel_id: int,
+        offset_id: int,
+        time_budget: float,
+        on_checkpoint: Optional[Callable[[int], None]],
+    ) -> Dict[str, Any]:
+        """
+        Страница за страницей: очистка -> запись (с дедупликацией) -> классификация,
+        как в обычном парсинге. После каждой записанной страницы вызывается
+        on_checkpoint(offset_id), поэтому прерванный backfill продолжается с места остановки.
+        Между страницами выдерживается пауза BACKFILL_PAGE_INTERVAL, чтобы backfill
+        не съедал лимит запросов аккаунта у регулярного цикла.
+        """
+        stats = FetchStats()
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        parsed = 0
+        inserted = 0
+        duplicates = 0
+        status = "completed"
+
+        async for page, offset_id in self.parser.iter_history(entity, offset_id, stats):
+            if page:
+                posts = await loop.run_in_executor(
+                    _clean_executor, self._prepare_posts, page, channel_id
+                )
+                parsed += len(posts)
+                page_inserted, page_duplicates = self._save_and_classify(posts)
+                inserted += page_inserted
+                duplicates += page_duplicates
+
+            if on_checkpoint is not None:
+                on_checkpoint(offset_id)
+
+            if time.monotonic() - started > time_budget:
+                status = "continued"
+                break
+            await asyncio.sleep(settings.BACKFILL_PAGE_INTERVAL)
+
+        return {
+            "posts_parsed": parsed,
+            "fetch_stats": stats.as_dict(),
+            "posts_saved": inserted,
+            "duplicates": duplicates,
+            "status": status,
+            "offset_id": offset_id,
+        }
+
+    def _save_and_classify(self, posts: List[PostCreate]) -> Tuple[int, int]:
+        inserted, duplicates = self._save_posts(posts)
+        if inserted > duplicates:
+            # Классификация идёт отдельной задачей в очереди classification
+            classify_posts_task.delay()
+        return inserted, duplicates
+
+    def _prepare_posts(self, page: List[Dict[str, Any]], channel_id: int) -> List[PostCreate]:
+        """Очищает страницу сообщений и собирает PostCreate (выполняется в пуле потоков)"""
+        cleaned = telegram_post_cleaner.clean_many(post.get("message") or "" for post in page)
+
+        posts = []
+        for post, cleaned_text in zip(page, cleaned):
+            post["message"] = cleaned_text
+            if self.dedup_index is not None:
+                post["simhash"] = simhash(cleaned_text)
+            post["channel_id"] = channel_id
+            posts.append(PostCreate(**post))
+        return posts
+
+    def _save_posts(self, posts: List[PostCreate]) -> Tuple[int, int]:
+        """
+        Сохраняет посты и в той же транзакции сдвигает курсор канала и связывает
+        почти-дубликаты с каноническими постами. Возвращает (вставлено, из них дубликатов).
+        """
+        inserted = self.post_repo.bulk_create(posts, commit=False)
+        newest = max(posts, key=lambda post: post.post_id)
+        self.post_repo.advance_channel_cursor(
+            newest.channel_id, newest.post_id, newest.date, commit=self.dedup_index is None
+        )
+        if self.dedup_index is None:
+            return len(inserted), 0
+
+        links = self.dedup_index.find_canonical(inserted)
+        self.post_repo.link_duplicates(links)
+        # В индекс попадают только зафиксированные канонические посты
+        self.dedup_index.add((post_id, value) for post_id, value in inserted if post_id not in links)
+
+        return len(inserted), len(links)
@@ -0,0 +1,146 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.core.config import settings
+from app.ml.feature_store import FeatureStore, get_feature_store
+from app.services.binary_classif_service import BinaryPredictions
+from app.services.model_registry import ModelRegistry, ModelSet, model_registry
+from app.services.prediction_cache import PredictionCache, prediction_cache
+
+TOPIC_FEATURES = "topics"
+PROBLEM_FEATURES = "problem"
+
+
+class PostClassifier:
+    """Классифицирует посты обеими моделями, используя кэш предсказаний"""
+
+    def __init__(
+        self,
+        registry: ModelRegistry,
+        cache: PredictionCache,
+        feature_store_dir: Optional[str] = settings.FEATURE_STORE_DIR,
+    ):
+        self.registry = registry
+        self.cache = cache
+        self.feature_store_dir = feature_store_dir
+
+    @property
+    def model_version(self) -> str:
+        return self.registry.active().version
+
+    def classify(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Возвращает для каждого текста поля topic, is_problem,
+        problem_probability и problem_confidence.
+        Одинаковые тексты и тексты из кэша повторно не классифицируются.
+        """
+        return self.classify_versioned(texts)[1]
+
+    def classify_versioned(self, texts: List[str]) -> Tuple[str, List[Dict[str, Any]]]:
+        """То же, что classify, плюс версия моделей, которыми посчитана вся пачка"""
+        models = self.registry.active()
+        version = models.version
+        keys = [self.cache.make_key(text, version) for text in texts]
+        unique_keys = list(dict.fromkeys(keys))
+
+        results = self.cache.get_many(unique_keys)
+
+        to_score = [k for k in unique_keys if k not in results]
+        if to_score:
+            first_text = {}
+            for key, text in zip(keys, texts):
+                first_text.setdefault(key, text)
+            batch = [first_text[k] for k in to_score]
+
+            topics = models.topic_service.predict_topics_batch(batch)
+            problems = models.problem_service.predict_batch(batch)
+
+            scored = dict(zip(to_score, self._to_results(topics, problems)))
+            self.cache.set_many(scored)
+            results.update(scored)
+
+        return version, [results[key] for key in keys]
+
+    def classify_posts(
+        self, post_ids: List[int], texts: List[str]
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Классифицирует посты из БД. Если задан FEATURE_STORE_DIR, TF-IDF признаки
+        считаются для всех постов и сохраняются в хранилище признаков по id поста.
+        """
+        if not self.feature_store_dir:
+            return self.classify_versioned(texts)
+
+        models = self.registry.active()
+        topic_features = models.topic_service.vectorize(texts)
+        problem_features = models.problem_service.vectorize(texts)
+
+        topics = models.topic_service.predict_topics_from_features(topic_features, texts)
+        problems = models.problem_service.predict_batch_from_features(problem_features, texts)
+
+        self.feature_store(models, TOPIC_FEATURES).append(post_ids, topic_features)
+        self.feature_store(models, PROBLEM_FEATURES).append(post_ids, problem_features)
+
+        results = self._to_results(topics, problems)
+        self.cache.set_many(
+            {
+                self.cache.make_key(text, models.version): result
+                for text, result in zip(texts, results)
+            }
+        )
+        return models.version, results
+
+    def feature_store(self, models: ModelSet, namespace: str) -> Optional[FeatureStore]:
+        """Хранилище признаков для модели тем (topics) или проблемности (problem)"""
+        if not self.feature_store_dir:
+            return None
+        service = (
+            models.topic_service if namespace == TOPIC_FEATURES else models.problem_service
+        )
+        return get_feature_store(self.feature_store_dir, namespace, service.model_version)
+
+    def explain_posts(
+        self, post_ids: List[int], texts: List[str], top_n: int = 10
+    ) -> List[Dict[str, List[Dict[str, Any]]]]:
+        """
+        Объяснения модели проблемности для постов. Признаки берутся из хранилища,
+        векторизуются только посты, которых там нет.
+        """
+        models = self.registry.active()
+        service = models.problem_service
+        store = self.feature_store(models, PROBLEM_FEATURES)
+
+        if store is None:
+            return service.explain_batch(texts, top_n=top_n)
+
+        features, found = store.read(post_ids)
+        missing = np.flatnonzero(~found)
+        if missing.size == len(post_ids):
+            return service.explain_batch(texts, top_n=top_n)
+
+        if missing.size:
+            computed = service.vectorize([texts[i] for i in missing])
+            features = sparse.lil_matrix(features, dtype=np.float64)
+            features[missing] = computed
+            features = features.tocsr()
+
+        return service.explain_batch(features=features, top_n=top_n)
+
+    @staticmethod
+    def _to_results(
+        topics: List[List[str]], problems: BinaryPredictions
+    ) -> List[Dict[str, Any]]:
+        return [
+            {
+                "topic": topics[i],
+                "is_problem": bool(problems.is_problem[i]),
+                "problem_probability": float(problems.probability[i]),
+                "problem_confidence": float(problems.confidence[i]),
+            }
+            for i in range(len(topics))
+        ]
+
+
+post_classifier = PostClassifier(model_registry, prediction_cache)
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List
+
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "prediction_cache:"
+REDIS_STATS_KEY = "prediction_cache:stats"
+
+
+class PredictionCache:
+    """
+    Кэш результатов классификации по хэшу очищенного текста и версии моделей.
+
+    Два уровня:
+    - LRU в памяти процесса, ограниченный maxsize записей;
+    - необязательный Redis, общий для всех воркеров (записи живут redis_ttl секунд).
+
+    Счётчики попаданий копятся в памяти и уходят в Redis в том же pipeline,
+    что и ближайший MGET (или чтение статистики), без отдельного запроса.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = settings.PREDICTION_CACHE_SIZE,
+        use_redis: bool = settings.PREDICTION_CACHE_REDIS,
+        redis_ttl: int = settings.PREDICTION_CACHE_TTL,
+    ):
+        self.maxsize = maxsize
+        self.use_redis = use_redis
+        self.redis_ttl = redis_ttl
+
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "redis_hits": 0, "misses": 0}
+        # Ещё не отправленные в Redis приращения счётчиков
+        self._unflushed = {"memory_hits": 0, "redis_hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_key(text: str, model_version: str) -> str:
+        return hashlib.sha1(f"{model_version}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Возвращает найденные в кэше значения, сначала из памяти, затем из Redis"""
+        found: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+
+        with self._lock:
+            for key in keys:
+                value = self._memory.get(key)
+                if value is None:
+                    missing.append(key)
+                else:
+                    self._memory.move_to_end(key)
+                    found[key] = value
+
+        memory_hits = len(found)
+        redis_hits = 0
+
+        if missing and self.use_redis:
+            deltas = self._take_unflushed()
+            try:
+                pipe = get_redis().pipeline(transaction=False)
+                pipe.mget([REDIS_KEY_PREFIX + k for k in missing])
+                self._queue_stats(pipe, deltas)
+                raw_values = pipe.execute()[0]
+                from_redis = {
+                    key: json.loads(raw) for key, raw in zip(missing, raw_values) if raw
+                }
+                redis_hits = len(from_redis)
+                found.update(from_redis)
+                self._remember(from_redis)
+            except redis.RedisError as e:
+                self._count_unflushed(deltas)
+                logger.warning(f"Redis-кэш предсказаний недоступен: {e}")
+
+        self._count(memory_hits, redis_hits, len(missing) - redis_hits)
+        return found
+
+    def set_many(self, values: Dict[str, Dict[str, Any]]):
+        """Сохраняет новые предсказания в оба уровня кэша"""
+        if not values:
+            return
+
+        self._remember(values)
+
+        if self.use_redis:
+            try:
+                pipe = get_redis().pipeline(transaction=False)
+                for key, value in values.items():
+                    pipe.set(REDIS_KEY_PREFIX + key, json.dumps(value), ex=self.redis_ttl)
+                pipe.execute()
+            except redis.RedisError as e:
+                logger.warning(f"Не удалось записать предсказания в Redis: {e}")
+
+    def _remember(self, values: Dict[str, Dict[str, Any]]):
+        with self._lock:
+            for key, value in values.items():
+                self._memory[key] = value
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def _count(self, memory_hits: int, redis_hits: int, misses: int):
+        deltas = {"memory_hits": memory_hits, "redis_hits": redis_hits, "misses": misses}
+        with self._lock:
+            for field, delta in deltas.items():
+                self._stats[field] += delta
+        if self.use_redis:
+            self._count_unflushed(deltas)
+
+    def _count_unflushed(self, deltas: Dict[str, int]):
+        with self._lock:
+            for field, delta in deltas.items():
+                self._unflushed[field] += delta
+
+    def _take_unflushed(self) -> Dict[str, int]:
+        with self._lock:
+            deltas = {field: delta for field, delta in self._unflushed.items() if delta}
+            self._unflushed = dict.fromkeys(self._unflushed, 0)
+        return deltas
+
+    @staticmethod
+    def _queue_stats(pipe, deltas: Dict[str, int]):
+        for field, delta in deltas.items():
+            pipe.hincrby(REDIS_STATS_KEY, field, delta)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики попаданий: этого процесса и суммарные по всем воркерам"""
+        with self._lock:
+            local = dict(self._stats, size=len(self._memory), maxsize=self.maxsize)
+
+        result: Dict[str, Any] = {"process": local, "cluster": None}
+        if self.use_redis:
+            deltas = self._take_unflushed()
+            try:
+                pipe = get_redis().pipeline(transaction=False)
+                self._queue_stats(pipe, deltas)
+                pipe.hgetall(REDIS_STATS_KEY)
+                raw = pipe.execute()[-1]
+                result["cluster"] = {k.decode(): int(v) for k, v in raw.items()}
+            except redis.RedisError as e:
+                self._count_unflushed(deltas)
+                logger.warning(f"Не удалось прочитать статистику кэша: {e}")
+
+        for counters in (result["process"], result["cluster"]):
+            if counters:
+                hits = counters.get("memory_hits", 0) + counters.get("redis_hits", 0)
+                total = hits + counters.get("misses", 0)
+                counters["hit_rate"] = hits / total if total else 0.0
+
+        return result
+
+
+prediction_cache = PredictionCache()
@@ -1,16 +1,233 @@
-from celery import shared_task
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
 
+from celery import chord, shared_task
+from celery.result import AsyncResult
+
+from app.core.config import settings
+from app.core.database import session_maker
 from app.decorators.channel_decorator import with_channel_service
-from app.services.channel_service import ChannelService
+from app.exceptions.custom_exceptions import RateLimitException
+from app.repositories.channel import ChannelRepository
+from app.services.channel_service import ChannelService, build_parse_summary
+from app.services.parse_coordinator import parse_coordinator
+
+logger = logging.getLogger(__name__)
+
+PARSE_LIMIT = 3000
+
+
+def _dispatch(
+    channel_ids: List[int], limit: int, cycle_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Ставит по задаче parse_channel на каждый канал, итог собирает колбэк
+    aggregate_parse_results. Каналы разбираются всеми процессами воркеров,
+    у каждой задачи своя сессия БД.
+    """
+    result = chord(
+        parse_channel_task.s(channel_id, limit, cycle_id) for channel_id in channel_ids
+    )(aggregate_parse_results_task.s(len(channel_ids), cycle_id))
+
+    if cycle_id is not None:
+        heartbeat_parse_cycle_task.apply_async(
+            (cycle_id, result.id, time.time() + settings.PARSE_CYCLE_MAX_DURATION),
+            countdown=parse_coordinator.cycle_lease / 3,
+        )
+
+    logger.info(f"Цикл парсинга: поставлено задач {len(channel_ids)}")
+    return {
+        "status": "dispatched",
+        "channels": len(channel_ids),
+        "cycle_id": cycle_id,
+        "summary_task_id": result.id,
+    }
 
 
 @shared_task(name="parse_channels_cycle")
+def parse_channels_cycle_task(limit: int = PARSE_LIMIT, trigger: str = "api"):
+    """
+    Внеплановый парсинг всех каналов (POST /parse). Пока идёт предыдущий
+    цикл, новый не запускается: повторный запуск сливается с текущим.
+    """
+    cycle_id = parse_coordinator.start_cycle(trigger)
+    if cycle_id is None:
+        running = parse_coordinator.current_cycle()
+        logger.info(f"Цикл парсинга {running} ещё идёт, повторный запуск пропущен")
+        return {"status": "already_running", "cycle_id": running}
+
+    try:
+        with session_maker() as session:
+            channel_ids = [
+                c.channel_id for c in ChannelRepository(session).get_all_channels() if c.username
+            ]
+        parse_coordinator.set_total(cycle_id, len(channel_ids))
+
+        if not channel_ids:
+            logger.warning("Нет каналов для парсинга")
+            parse_coordinator.finish_cycle(cycle_id)
+            return build_parse_summary([], 0)
+
+        return _dispatch(channel_ids, limit, cycle_id)
+    except Exception:
+        parse_coordinator.finish_cycle(cycle_id, status="failed")
+        raise
+
+
+@shared_task(name="heartbeat_parse_cycle")
+def heartbeat_parse_cycle_task(cycle_id: str, summary_task_id: str, deadline: float):
+    """
+    Продлевает аренду цикла, пока его chord не завершился: задачи каналов продлевают
+    её только во время работы, а в очереди они могут ждать дольше аренды.
+    Перезапускает себя каждые cycle_lease / 3 секунд; останавливается, когда колбэк
+    завершил цикл (снял блокировку или упал) либо наступил deadline.
+    """
+    if AsyncResult(summary_task_id).ready() or not parse_coordinator.heartbeat(cycle_id):
+        return {"cycle_id": cycle_id, "status": "finished"}
+    if time.time() > deadline:
+        logger.warning(f"Цикл парсинга {cycle_id} не завершился за отведённое время")
+        return {"cycle_id": cycle_id, "status": "deadline"}
+
+    heartbeat_parse_cycle_task.apply_async(
+        (cycle_id, summary_task_id, deadline), countdown=parse_coordinator.cycle_lease / 3
+    )
+    return {"cycle_id": cycle_id, "status": "extended"}
+
+
+@shared_task(name="dispatch_due_channels")
+def dispatch_due_channels_task(limit: int = PARSE_LIMIT, max_channels: Optional[int] = None):
+    """
+    Тик планировщика: ставит в очередь только каналы, у которых подошёл
+    next_parse_at. Интервал каждого канала подбирается по его активности.
+    """
+    now = datetime.now(timezone.utc)
+    with session_maker() as session:
+        channel_ids = ChannelRepository(session).claim_due_channels(
+            now, now + timedelta(seconds=settings.PARSE_DISPATCH_LEASE), max_channels
+        )
+
+    if not channel_ids:
+        return {"status": "idle", "channels": 0}
+
+    return _dispatch(channel_ids, limit)
+
+
+@shared_task(name="parse_channel")
+def parse_channel_task(
+    channel_id: int, limit: int = PARSE_LIMIT, cycle_id: Optional[str] = None
+):
+    """
+    Парсинг одного канала под блокировкой канала в Redis: если канал уже
+    парсится (другим циклом или тиком), задача его пропускает.
+    Ошибки возвращаются результатом, чтобы цикл всегда досчитывал каналы и завершался.
+    """
+    lock = parse_coordinator.channel_lock(channel_id)
+    with lock.hold(on_heartbeat=lambda: parse_coordinator.heartbeat(cycle_id)) as acquired:
+        if acquired:
+            try:
+                result = _parse_channel(channel_id, limit)
+            except Exception as e:
+                # Ошибка не должна ронять chord: иначе колбэк не снимет блокировку цикла
+                logger.error(f"Ошибка парсинга канала {channel_id}: {e}")
+                result = {
+                    "channel": channel_id,
+                    "status": "error",
+                    "error": str(e),
+                    "posts_parsed": 0,
+                    "posts_saved": 0,
+                }
+        else:
+            logger.info(f"Канал {channel_id} уже парсится, пропускаем")
+            result = {
+                "channel": channel_id,
+                "status": "already_running",
+                "posts_parsed": 0,
+                "posts_saved": 0,
+            }
+
+    parse_coordinator.channel_done(cycle_id, failed="error" in result)
+    return result
+
+
 @with_channel_service
-def parse_channels_cycle_task(channel_service: ChannelService = None):
-    return channel_service.parse_channels(delay=0.1, limit=3000)
+def _parse_channel(channel_id: int, limit: int, channel_service: ChannelService = None):
+    return channel_service.parse_channel(channel_id, limit)
+
+
+@shared_task(name="aggregate_parse_results")
+def aggregate_parse_results_task(
+    results: List[Dict[str, Any]], channels_count: int, cycle_id: Optional[str] = None
+):
+    summary = build_parse_summary(results, channels_count)
+    if cycle_id is not None:
+        parse_coordinator.finish_cycle(cycle_id)
+    return summary
 
 
 @shared_task(name="parse_channel_info")
+def parse_channel_info_task(channel_link: str):
+    result = _add_channel(channel_link)
+    # Историю нового канала догружает backfill в своей очереди
+    backfill_channel_task.delay(result["channel_id"])
+    return result
+
+
 @with_channel_service
-def parse_channel_info_task(channel_link: str, channel_service: ChannelService = None):
+def _add_channel(channel_link: str, channel_service: ChannelService = None):
     return channel_service.add_channel_if_not_exists(channel_link)
+
+
+@with_channel_service
+def _import_channels(task, channel_links: List[str], channel_service: ChannelService = None):
+    def report(progress: Dict[str, int]):
+        task.update_state(state="PROGRESS", meta=progress)
+
+    return channel_service.import_channels(channel_links, on_progress=report)
+
+
+@shared_task(name="import_channels", bind=True)
+def import_channels_task(self, channel_links: List[str]):
+    """Массовый импорт каналов; прогресс доступен в состоянии задачи (PROGRESS)"""
+    result = _import_channels(self, channel_links)
+    for channel_id in result["channel_ids"]:
+        backfill_channel_task.delay(channel_id)
+    return result
+
+
+@shared_task(name="backfill_channel", bind=True)
+def backfill_channel_task(
+    self, channel_id: int, time_budget: int = settings.BACKFILL_TIME_BUDGET
+):
+    """
+    Догрузка полной истории канала в низкоприоритетной очереди backfill.
+    Работает time_budget секунд и перезапускает себя; при долгом FloodWait
+    или пока канал ни разу не парсился, откладывается на BACKFILL_RETRY_DELAY.
+    Прогресс хранится в канале.
+    """
+    with parse_coordinator.backfill_lock(channel_id).hold() as acquired:
+        if not acquired:
+            return {"channel": channel_id, "status": "already_running"}
+        try:
+            result = _backfill_channel(channel_id, time_budget)
+        except RateLimitException as e:
+            logger.warning(f"Backfill канала {channel_id} отложен: {e}")
+            result = {"channel": channel_id, "status": "throttled", "error": str(e)}
+
+    if result["status"] == "continued":
+        self.apply_async(args=(channel_id, time_budget))
+    elif result["status"] in ("throttled", "waiting"):
+        self.apply_async(args=(channel_id, time_budget), countdown=settings.BACKFILL_RETRY_DELAY)
+    return result
+
+
+@with_channel_service
+def _backfill_channel(channel_id: int, time_budget: int, channel_service: ChannelService = None):
+    return channel_service.backfill_channel(channel_id, time_budget)
+
+
+@shared_task(name="refresh_engagement")
+@with_channel_service
+def refresh_engagement_task(channel_service: ChannelService = None):
+    return channel_service.refresh_engagement()
@@ -0,0 +1,152 @@
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from celery import shared_task
+
+from app.core.database import session_maker
+from app.core.redis_client import get_redis
+from app.repositories.post import PostRepository
+from app.services.post_classifier import post_classifier
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+MAX_BATCHES = 200  # не держим воркер бесконечно, остаток подберёт следующий запуск
+
+RECLASSIFY_BATCH_SIZE = 5000
+RECLASSIFY_TIME_BUDGET = 600  # секунд на один запуск, затем задача перезапускает себя
+RECLASSIFY_CHECKPOINT_KEY = "reclassify:checkpoint:{model_version}"
+
+
+@shared_task(name="classify_posts")
+def classify_posts_task(batch_size: int = BATCH_SIZE, max_batches: int = MAX_BATCHES):
+    """Классифицирует посты, ожидающие классификации, пачками"""
+    classified = 0
+    batches = 0
+
+    with session_maker() as session:
+        post_repo = PostRepository(session)
+
+        while batches < max_batches:
+            pending = post_repo.get_pending_classification(batch_size)
+            if not pending:
+                session.commit()
+                break
+
+            model_version, predictions = post_classifier.classify_posts(
+                [post_id for post_id, _ in pending], [message for _, message in pending]
+            )
+            now = datetime.now(timezone.utc)
+
+            classified += post_repo.bulk_update_classification(
+                [
+                    {
+                        "id": post_id,
+                        **prediction,
+                        "model_version": model_version,
+                        "classified_at": now,
+                        "updated_at": now,
+                    }
+                    for (post_id, _), prediction in zip(pending, predictions)
+                ]
+            )
+            batches += 1
+
+        # Дубликаты, вставленные, пока их канонический пост классифицировался
+        copied = post_repo.copy_canonical_classification()
+        session.commit()
+
+    return {"classified": classified, "batches": batches, "duplicates_copied": copied}
+
+
+@shared_task(name="reclassify_posts", bind=True)
+def reclassify_posts_task(
+    self,
+    batch_size: int = RECLASSIFY_BATCH_SIZE,
+    time_budget: int = RECLASSIFY_TIME_BUDGET,
+    model_version: Optional[str] = None,
+):
+    """
+    Переклассифицирует все посты текущими моделями (после переобучения).
+    Идёт по id в keyset-порядке, после каждой пачки сохраняет контрольную точку
+    в Redis, поэтому задачу можно прервать и запустить снова.
+    Перезапускает себя, только если контрольная точка сдвинулась: ошибка
+    классификатора останавливает задачу, а не зацикливает её.
+    """
+    model_version = model_version or post_classifier.model_version
+    checkpoint_key = RECLASSIFY_CHECKPOINT_KEY.format(model_version=model_version)
+    redis_client = get_redis()
+
+    last_id = int(redis_client.get(checkpoint_key) or 0)
+    start_id = last_id
+    started = time.monotonic()
+    reclassified = 0
+
+    with session_maker() as session:
+        post_repo = PostRepository(session)
+
+        while True:
+            if post_classifier.model_version != model_version:
+                logger.warning(
+                    f"Модели сменились ({model_version} -> {post_classifier.model_version}), "
+                    f"переклассификация остановлена на id={last_id}"
+                )
+                return {"status": "model_changed", "last_id": last_id, "reclassified": reclassified}
+
+            rows = post_repo.get_classified_after(last_id, batch_size, model_version)
+            if not rows:
+                session.commit()
+                logger.info(f"Переклассификация моделями {model_version} завершена")
+                return {"status": "completed", "last_id": last_id, "reclassified": reclassified}
+
+            try:
+                batch_version, predictions = post_classifier.classify_posts(
+                    [post_id for post_id, _ in rows], [message for _, message in rows]
+                )
+            except Exception:
+                session.rollback()
+                logger.exception(
+                    f"Ошибка классификатора, переклассификация остановлена на id={last_id}"
+                )
+                raise
+            if batch_version != model_version:
+                continue
+            now = datetime.now(timezone.utc)
+
+            reclassified += post_repo.bulk_update_classification(
+                [
+                    {
+                        "id": post_id,
+                        **prediction,
+                        "model_version": model_version,
+                        "classified_at": now,
+                        "updated_at": now,
+                    }
+                    for (post_id, _), prediction in zip(rows, predictions)
+                ]
+            )
+            last_id = rows[-1][0]
+            redis_client.set(checkpoint_key, last_id)
+
+            if time.monotonic() - started > time_budget:
+                break
+
+    elapsed = time.monotonic() - started
+    if last_id == start_id:
+        logger.error(f"Контрольная точка не сдвинулась (id={last_id}), перезапуск отменён")
+        return {"status": "stalled", "last_id": last_id, "reclassified": reclassified}
+
+    logger.info(
+        f"Переклассифицировано {reclassified} постов за {elapsed:.0f} с "
+        f"({reclassified / max(elapsed, 1e-9) * 60:.0f} в минуту), продолжаем с id={last_id}"
+    )
+    self.apply_async(
+        kwargs={
+            "batch_size": batch_size,
+            "time_budget": time_budget,
+            "model_version": model_version,
+        }
+    )
+    return {"status": "continued", "last_id": last_id, "reclassified": reclassified}
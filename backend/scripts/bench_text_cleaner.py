@@ -0,0 +1,124 @@
+"""
+Проверка и замер скорости очистки Telegram-постов.
+
+Сравнивает TelegramPostCleaner с прежней реализацией clean_telegram_post
+(каждый вызов собирал регулярные выражения заново): результат на эталонном
+корпусе должен совпадать байт в байт. Затем печатает число постов в секунду.
+
+    python -m scripts.bench_text_cleaner [--posts 20000]
+"""
+import argparse
+import random
+import re
+import time
+
+from app.dependencies.text_cleaner import AD_PATTERNS, TelegramPostCleaner
+
+
+def legacy_clean_telegram_post(text: str) -> str:
+    """Прежняя реализация, оставлена как эталон"""
+    if not text:
+        return ""
+
+    text = re.sub(r'\s*\[[^]]*\]\([^)]*\)\s*', '\n', text)
+    text = re.sub(r'https?://\S+|t\.me/[^\s\)\]\n]+', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'@[a-zA-Z0-9_]+', '', text)
+
+    emoji_pattern = re.compile(
+        "["
+        "\U0001F600-\U0001F64F"
+        "\U0001F300-\U0001F5FF"
+        "\U0001F680-\U0001F6FF"
+        "\U0001F1E0-\U0001F1FF"
+        "\U00002702-\U000027B0"
+        "\U000024C2-\U0001F251"
+        "]+",
+        flags=re.UNICODE,
+    )
+    text = emoji_pattern.sub(r'', text)
+
+    for pattern in AD_PATTERNS:
+        text = re.sub(rf'(?im)\s*{pattern}.*?$', '', text)
+
+    text = re.sub(r'[^\w\s\-\«\»\"\'\.\,\:\;\!\?\(\)\—]', ' ', text)
+
+    text = re.sub(r'\n\s*\n', '\n\n', text)
+    text = re.sub(r'[ \t]+', ' ', text)
+    text = re.sub(r'^\s+|\s+$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+
+    return text.strip()
+
+
+GOLDEN_CORPUS = [
+    "",
+    "   ",
+    "Обычная новость без рекламы.",
+    "В Кызыле отключат воду 12 мая с 9:00 до 18:00.\n\nПодробности у диспетчера.",
+    "Жители жалуются на ямы на улице Ленина 🚧🚗\n\nФото: читатель",
+    "[Читать полностью](https://example.com/news/1) — мэрия ответила",
+    "Подписывайтесь: t.me/+Vf8kMe9-6txmZTAy и https://t.me/prokzl",
+    "Источник @mtyva_bot, фото @some_user_123",
+    "Прислать фото и видео: @mtyva_bot\nЛюбую информацию присылайте\nПригласить друга — по ссылке",
+    "Новость дня.\n\nПо рекламе: @manager\n№ 6010050555 #2WMY0",
+    "Присылайте мне всё, что происходит в городе!\nЕсли новость эксклюзивная — заплачу!",
+    "Красивые фото приветствуются 📸\nManager Тыва",
+    "Launch the app right away",
+    "реклама\n\nзаплачу 100 рублей",
+    "Контакты: +7 999 000 00 00\nСотрудничество — в личку",
+    "По вопросам: admin\nНомер для рекламы 8-800",
+    "Напишите бот @feedback_bot или бот помощи",
+    "Цены на уголь выросли на 15% (данные Росстата) — «это предел», говорят жители.",
+    "Строка с    множеством   пробелов\t\tи табами\n\n\n\nи пустыми строками",
+    "Текст #хештег #tag #длинныйхештег и #abc",
+    "@t.me/x)abc и (t.me/channel) [ссылка](t.me/y)",
+    "Смешанный Text with English words and цифры 2024 ✅✔️",
+    "Эмодзи в середине➡️слова и ©® символы ™",
+    "***Жирный*** __курсив__ `код` ~зачёркнутый~",
+    "ПО РЕКЛАМЕ ПИСАТЬ СЮДА\nА это обычная строка",
+    "Первая строка\n  \n  вторая строка после пробелов  \n",
+    "Информация\nреклама —\nпосле рекламы",
+]
+
+
+def make_posts(count: int, seed: int = 0):
+    """Синтетический поток постов из эталонного корпуса (с повторами, как в каналах)"""
+    rng = random.Random(seed)
+    return [
+        "\n".join(rng.choice(GOLDEN_CORPUS) for _ in range(rng.randint(1, 4)))
+        for _ in range(count)
+    ]
+
+
+def posts_per_second(clean, posts, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        clean(posts)
+        best = min(best, time.perf_counter() - started)
+    return len(posts) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк очистки Telegram-постов")
+    parser.add_argument("--posts", type=int, default=20000)
+    args = parser.parse_args()
+
+    cleaner = TelegramPostCleaner()
+    posts = make_posts(args.posts)
+
+    for text in GOLDEN_CORPUS + posts:
+        expected = legacy_clean_telegram_post(text)
+        actual = cleaner.clean(text)
+        if actual.encode("utf-8") != expected.encode("utf-8"):
+            raise SystemExit(f"Расхождение на {text!r}: {expected!r} != {actual!r}")
+    print(f"Эталонный корпус: {len(GOLDEN_CORPUS) + len(posts)} текстов совпадают")
+
+    before = posts_per_second(lambda texts: [legacy_clean_telegram_post(t) for t in texts], posts)
+    after = posts_per_second(cleaner.clean_many, posts)
+    print(f"до:    {before:,.0f} постов/с")
+    print(f"после: {after:,.0f} постов/с (x{after / before:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Сквозная проверка классификации после изменений в сервисах моделей.
+
+1. Загружает активные модели (как warm_up воркера) и классифицирует
+   канареечный набор через post_classifier: все поля результата на месте.
+2. С --db выполняет одну пачку classify_posts прямо в этом процессе
+   (без брокера) на реальной БД и проверяет, что ожидающие посты размечены.
+
+    python -m scripts.smoke_classify [--db] [--batch-size 50]
+"""
+import argparse
+
+from app.core.database import session_maker
+from app.models.post import Post
+from app.services.model_registry import CANARY_TEXTS, model_registry
+from app.services.post_classifier import post_classifier
+from app.tasks.classification import classify_posts_task
+from sqlalchemy import func, select
+
+RESULT_FIELDS = {"topic", "is_problem", "problem_probability", "problem_confidence"}
+
+
+def check_models():
+    model_registry.warm_up()
+    version, results = post_classifier.classify_versioned(CANARY_TEXTS)
+
+    if len(results) != len(CANARY_TEXTS):
+        raise SystemExit(f"Ожидалось {len(CANARY_TEXTS)} результатов, получено {len(results)}")
+    for text, result in zip(CANARY_TEXTS, results):
+        if not RESULT_FIELDS <= result.keys():
+            raise SystemExit(f"Неполный результат для {text!r}: {result}")
+    print(f"Модели {version}: канареечный набор из {len(results)} текстов классифицирован")
+
+
+def pending_count() -> int:
+    with session_maker() as session:
+        return session.execute(
+            select(func.count(Post.id)).where(
+                Post.classified_at.is_(None), Post.canonical_post_id.is_(None)
+            )
+        ).scalar_one()
+
+
+def check_task(batch_size: int):
+    before = pending_count()
+    result = classify_posts_task(batch_size=batch_size, max_batches=1)
+    after = pending_count()
+
+    print(f"classify_posts: {result}, ожидают классификации: {before} -> {after}")
+    if before and not result["classified"]:
+        raise SystemExit("Есть ожидающие посты, но пачка ничего не классифицировала")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозная проверка классификации")
+    parser.add_argument("--db", action="store_true", help="выполнить одну пачку classify_posts")
+    parser.add_argument("--batch-size", type=int, default=50)
+    args = parser.parse_args()
+
+    check_models()
+    if args.db:
+        check_task(args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
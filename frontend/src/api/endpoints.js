@@ -1,9 +1,9 @@
 import apiClient from './client'
 
 export const postsApi = {
-  getPostsByDate(dateFrom, dateTo) {
+  getPostsByDate(dateFrom, dateTo, canonicalOnly = false) {
     return apiClient.get('/analytics/posts-count-by-date', {
-      params: { date_from: dateFrom, date_to: dateTo }
+      params: { date_from: dateFrom, date_to: dateTo, canonical_only: canonicalOnly }
     })
   },
   
@@ -13,9 +13,9 @@ export const postsApi = {
     })
   },
 
-  getPostsCountByTopic(dateFrom, dateTo) {
+  getPostsCountByTopic(dateFrom, dateTo, canonicalOnly = false) {
     return apiClient.get('/analytics/posts-count-by-topic', {
-      params: { date_from: dateFrom, date_to: dateTo }
+      params: { date_from: dateFrom, date_to: dateTo, canonical_only: canonicalOnly }
     })
   },
 
@@ -29,6 +29,13 @@ export const postsApi = {
     })
   },
 
+  explainPosts(ids, topN = 10) {
+    return apiClient.get('/analytics/posts/explain', {
+      params: { ids, top_n: topN },
+      paramsSerializer: { indexes: null }
+    })
+  },
+
   getChannels() {
     return apiClient.get('/analytics/channels')
   },